@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import SignupLog, LoginLog
+from .models import AuthEvent
 from django.contrib import admin
 from .models import Profile
 
@@ -22,13 +22,15 @@ class ProfileAdmin(admin.ModelAdmin):
 
 admin.site.register(Profile, ProfileAdmin)
 
-@admin.register(SignupLog)
-class SignupLogAdmin(admin.ModelAdmin):
-    list_display = ("user", "users_id", "signup_time")  # Fields shown in the admin list view
- # Enable search by username and UUID
-    readonly_fields = ("signup_time",)  # Prevent editing signup time
-
-@admin.register(LoginLog)
-class LoginLogAdmin(admin.ModelAdmin):
-    list_display = ("user", "login_time")
-    readonly_fields = ("login_time",)  # Make login_time read-only
+@admin.register(AuthEvent)
+class AuthEventAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "event", "user", "email", "ip_address")
+    list_filter = ("event",)
+    list_select_related = ("user",)
+    search_fields = ("user__email", "email")
+    raw_id_fields = ("user",)
+    ordering = ("-created_at",)
+
+    # The log is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
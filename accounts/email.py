@@ -0,0 +1,49 @@
+"""
+Djoser's emails, rendered during the request (their context needs it) and
+handed to the task worker for delivery, so the SMTP round trip isn't part
+of the response time.
+"""
+from django.conf import settings
+from djoser import email
+
+from .tasks import send_email
+
+
+class QueuedEmailMixin:
+    def send(self, to, *args, **kwargs):
+        self.render()
+        send_email.delay(
+            subject=self.subject,
+            body=self.body,
+            from_email=kwargs.pop('from_email', settings.DEFAULT_FROM_EMAIL),
+            to=list(to),
+            cc=list(kwargs.pop('cc', [])),
+            bcc=list(kwargs.pop('bcc', [])),
+            reply_to=list(kwargs.pop('reply_to', [])),
+            alternatives=[list(alternative) for alternative in self.alternatives],
+            content_subtype=self.content_subtype,
+        )
+
+
+class ActivationEmail(QueuedEmailMixin, email.ActivationEmail):
+    pass
+
+
+class ConfirmationEmail(QueuedEmailMixin, email.ConfirmationEmail):
+    pass
+
+
+class PasswordResetEmail(QueuedEmailMixin, email.PasswordResetEmail):
+    pass
+
+
+class PasswordChangedConfirmationEmail(QueuedEmailMixin, email.PasswordChangedConfirmationEmail):
+    pass
+
+
+class UsernameChangedConfirmationEmail(QueuedEmailMixin, email.UsernameChangedConfirmationEmail):
+    pass
+
+
+class UsernameResetEmail(QueuedEmailMixin, email.UsernameResetEmail):
+    pass
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_logs(apps, schema_editor):
+    AuthEvent = apps.get_model('accounts', 'AuthEvent')
+    SignupLog = apps.get_model('accounts', 'SignupLog')
+    LoginLog = apps.get_model('accounts', 'LoginLog')
+
+    AuthEvent.objects.bulk_create(
+        [
+            AuthEvent(user_id=log.user_id, event='signup', created_at=log.signup_time)
+            for log in SignupLog.objects.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+    AuthEvent.objects.bulk_create(
+        [
+            AuthEvent(user_id=log.user_id, event='login', created_at=log.login_time)
+            for log in LoginLog.objects.iterator(chunk_size=1000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_remove_profile_first_name_remove_profile_last_login_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('signup', 'Signup'), ('login', 'Login'), ('login_failed', 'Failed login'), ('logout', 'Logout')], max_length=20)),
+                ('email', models.EmailField(blank=True, default='', max_length=254)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, default='', max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='auth_events', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='authevent',
+            index=models.Index(fields=['user', '-created_at'], name='authevent_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authevent',
+            index=models.Index(fields=['created_at'], name='authevent_created_idx'),
+        ),
+        migrations.RunPython(copy_logs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='signuplog',
+            name='user',
+        ),
+        migrations.DeleteModel(
+            name='LoginLog',
+        ),
+        migrations.DeleteModel(
+            name='SignupLog',
+        ),
+    ]
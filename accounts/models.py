@@ -1,29 +1,39 @@
 from django.db import models
-import uuid
 from django.utils.timezone import now
 from django.contrib.auth import get_user_model
 from datetime import timedelta
 
 User = get_user_model()
 
-class SignupLog(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    users_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False) 
-    signup_time = models.DateTimeField(auto_now_add=True)
-    first_name = models.CharField(max_length=50, blank=True, null=True)  
-    last_name = models.CharField(max_length=50, blank=True, null=True)   
+class AuthEvent(models.Model):
+    """One signup, login or logout. Append-only; written through accounts.auth_log."""
+    SIGNUP = 'signup'
+    LOGIN = 'login'
+    LOGIN_FAILED = 'login_failed'
+    LOGOUT = 'logout'
+    EVENT_CHOICES = [
+        (SIGNUP, 'Signup'),
+        (LOGIN, 'Login'),
+        (LOGIN_FAILED, 'Failed login'),
+        (LOGOUT, 'Logout'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='auth_events')
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    # The address tried, for failed logins that don't match a user
+    email = models.EmailField(blank=True, default='')
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=200, blank=True, default='')
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='authevent_user_created_idx'),
+            models.Index(fields=['created_at'], name='authevent_created_idx'),
+        ]
 
     def __str__(self):
-        return f"Signup - {self.first_name} {self.last_name} ({self.users_id})"
-
-class LoginLog(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    login_time = models.DateTimeField(default=now)
-    first_name = models.CharField(max_length=50, blank=True, null=True)  
-    last_name = models.CharField(max_length=50, blank=True, null=True)   
-
-    def __str__(self):
-        return f"Login - {self.first_name} {self.last_name} at {self.login_time}"
+        return f"{self.get_event_display()} - {self.user or self.email} at {self.created_at}"
     
 
 from django.conf import settings  # ✅ correct way
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import LoginLog, SignupLog
+from . import auth_log
+from .models import AuthEvent
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
 User = get_user_model()
@@ -19,7 +20,7 @@ class SignupSerializer(serializers.ModelSerializer):
         last_name = validated_data.get("last_name")  
 
         user = User.objects.create_user(email=email, password=password, first_name=first_name, last_name=last_name)  
-        SignupLog.objects.create(user=user, first_name=first_name, last_name=last_name)   
+        auth_log.record(AuthEvent.SIGNUP, user=user)
 
         return user
 
@@ -49,7 +50,7 @@ class LoginSerializer(serializers.Serializer):
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
-        model = LoginLog
+        model = AuthEvent
         fields = '__all__'
 
 
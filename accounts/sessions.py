@@ -0,0 +1,33 @@
+"""
+Sessions for the browser, tokens for everyone else.
+
+The signup and login endpoints hand out JWTs on every call, and API clients
+(the mobile app, scripts) authenticate with those alone. Logging them in with
+``django.contrib.auth.login`` as well would write a ``django_session`` row per
+login that is never read again, so a session is only started for the HTML
+flows: responses rendered as pages (``?redirect=true``, ``AuthView``) and the
+auth page's own forms, which ask for one with ``?session=true``.
+
+Both paths send ``user_logged_in``, so the auth event log and ``last_login``
+see every login.
+"""
+from django.contrib.auth import login as django_login
+from django.contrib.auth.signals import user_logged_in
+
+
+def wants_session(request):
+    params = request.query_params
+    return params.get('redirect') == 'true' or params.get('session') == 'true'
+
+
+def login(request, user, session=None):
+    """
+    Log ``user`` in for this request. A session is started when ``session``
+    is true, or when it is None and the request asks for one.
+    """
+    if session is None:
+        session = wants_session(request)
+    if session:
+        django_login(request, user)
+    else:
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
@@ -1,17 +1,27 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.core.signals import request_finished
 from django.dispatch import receiver
-from django.contrib.auth import get_user_model
 
-User = get_user_model()
+from . import auth_log
+from .models import AuthEvent
 
-@receiver(post_save, sender=User)
-def create_profile_on_user_create(sender, instance, created, **kwargs):
-    if created:
-        profile, _ = Profile.objects.get_or_create(user=instance)
-        profile.update_from_signup_log()
 
-@receiver(post_save, sender=LoginLog)
-def update_profile_on_login(sender, instance, created, **kwargs):
-    if created:
-        profile, _ = Profile.objects.get_or_create(user=instance.user)
-        profile.update_from_login_log()
\ No newline at end of file
+@receiver(user_logged_in)
+def log_login(sender, request, user, **kwargs):
+    auth_log.record(AuthEvent.LOGIN, user=user, request=request)
+
+
+@receiver(user_login_failed)
+def log_failed_login(sender, credentials, request=None, **kwargs):
+    auth_log.record(AuthEvent.LOGIN_FAILED, request=request, email=credentials.get('username', '')[:254])
+
+
+@receiver(user_logged_out)
+def log_logout(sender, request, user, **kwargs):
+    if user is not None:
+        auth_log.record(AuthEvent.LOGOUT, user=user, request=request)
+
+
+@receiver(request_finished)
+def flush_auth_log(sender, **kwargs):
+    auth_log.buffer.flush_if_due()
@@ -0,0 +1,46 @@
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMultiAlternatives
+from PIL import Image, ImageOps
+
+from taskqueue.registry import task
+
+from .models import Profile
+
+# Profile images are shown small; larger uploads are scaled down to fit.
+PROFILE_IMAGE_SIZE = 512
+
+
+@task(max_attempts=5)
+def send_email(subject, body, from_email, to, cc=(), bcc=(), reply_to=(), alternatives=(), content_subtype='plain'):
+    message = EmailMultiAlternatives(
+        subject, body, from_email, to,
+        cc=cc, bcc=bcc, reply_to=reply_to,
+        alternatives=[tuple(alternative) for alternative in alternatives],
+    )
+    message.content_subtype = content_subtype
+    message.send()
+
+
+@task(queue='media')
+def shrink_profile_image(profile_id):
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None or not profile.profile_image:
+        return
+    field_file = profile.profile_image
+    with field_file.storage.open(field_file.name, 'rb') as file:
+        image = Image.open(file)
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if max(image.size) <= PROFILE_IMAGE_SIZE:
+        return
+
+    image.thumbnail((PROFILE_IMAGE_SIZE, PROFILE_IMAGE_SIZE), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, image_format)
+    field_file.storage.delete(field_file.name)
+    name = field_file.storage.save(field_file.name, ContentFile(buffer.getvalue()))
+    if name != field_file.name:
+        Profile.objects.filter(pk=profile.pk).update(profile_image=name)
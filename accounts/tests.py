@@ -1,3 +1,155 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import QueryBudgetMixin
+from user.models import User
+
+from . import auth_log
+from .models import AuthEvent, Profile
+
+PASSWORD = 'secret-pass-123'
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='shopper@example.com', password=PASSWORD, first_name='Ada', last_name='Obi'
+        )
+
+    def test_signup_page(self):
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse('signup'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_signup(self):
+        with self.assertMaxQueries(7):
+            response = self.client.post(reverse('signup'), {
+                'email': 'new@example.com',
+                'password': PASSWORD,
+                'first_name': 'New',
+                'last_name': 'Shopper',
+            })
+        self.assertEqual(response.status_code, 201)
+
+    def test_login(self):
+        with self.assertMaxQueries(3):
+            response = self.client.post(reverse('login'), {'email': self.user.email, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200)
+
+    def test_auth_login(self):
+        with self.assertMaxQueries(9):
+            response = self.client.post(
+                reverse('auth') + '?mode=login', {'email': self.user.email, 'password': PASSWORD}
+            )
+        self.assertEqual(response.context['message'], 'Login successful')
+
+    def test_profile_page(self):
+        self.client.force_login(self.user)
+        with self.assertMaxQueries(6):
+            response = self.client.get(reverse('profile-page'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_update(self):
+        self.client.force_login(self.user)
+        Profile.objects.create(user=self.user)
+        with self.assertMaxQueries(5):
+            response = self.client.post(reverse('profile-page'), {'first_name': 'Adaeze', 'last_name': 'Obi'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse('logout'))
+        self.assertEqual(response.status_code, 200)
+
+
+class SessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='shopper@example.com', password=PASSWORD)
+
+    def test_api_login_gets_tokens_only(self):
+        response = self.client.post(reverse('login'), {'email': self.user.email, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.data)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_api_signup_gets_tokens_only(self):
+        response = self.client.post(reverse('signup'), {
+            'email': 'new@example.com', 'password': PASSWORD, 'first_name': 'New', 'last_name': 'Shopper',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('refresh_token', response.data)
+        self.assertFalse(Session.objects.exists())
+
+    def test_browser_login_starts_session(self):
+        response = self.client.post(reverse('login') + '?session=true', {'email': self.user.email, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Session.objects.count(), 1)
+        response = self.client.get(reverse('profile-page'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_auth_page_starts_session(self):
+        self.client.post(reverse('auth') + '?mode=login', {'email': self.user.email, 'password': PASSWORD})
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class AuthEventLogTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='shopper@example.com', password=PASSWORD)
+
+    def events(self):
+        return list(AuthEvent.objects.order_by('id').values_list('event', 'email'))
+
+    def test_events_are_buffered_until_flushed(self):
+        self.client.post(reverse('signup'), {
+            'email': 'new@example.com', 'password': PASSWORD, 'first_name': 'New', 'last_name': 'Shopper',
+        })
+        # Logging out needs a session, which only browser logins get
+        self.client.post(reverse('login') + '?session=true', {'email': self.user.email, 'password': PASSWORD})
+        self.client.post(reverse('login'), {'email': self.user.email, 'password': 'wrong-password'})
+        self.client.get(reverse('logout'))
+        self.assertEqual(AuthEvent.objects.count(), 0)
+
+        with self.assertNumQueries(3):  # savepoint, INSERT, release
+            self.assertEqual(auth_log.flush(), 5)
+        self.assertEqual(self.events(), [
+            (AuthEvent.SIGNUP, 'new@example.com'),
+            (AuthEvent.LOGIN, 'new@example.com'),
+            (AuthEvent.LOGIN, self.user.email),
+            (AuthEvent.LOGIN_FAILED, self.user.email),
+            (AuthEvent.LOGOUT, self.user.email),
+        ])
+        # One row per login, not one per user
+        self.client.post(reverse('login'), {'email': self.user.email, 'password': PASSWORD})
+        auth_log.flush()
+        self.assertEqual(self.user.auth_events.filter(event=AuthEvent.LOGIN).count(), 2)
+
+    def test_flushes_on_size_and_age(self):
+        buffer = auth_log.EventBuffer(size=2, interval=60)
+        buffer.add(AuthEvent(user=self.user, event=AuthEvent.LOGIN))
+        self.assertEqual(len(buffer), 1)
+        buffer.add(AuthEvent(user=self.user, event=AuthEvent.LOGIN))
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(AuthEvent.objects.count(), 2)
+
+        buffer = auth_log.EventBuffer(size=100, interval=0)
+        buffer.add(AuthEvent(user=self.user, event=AuthEvent.LOGOUT))
+        self.assertEqual(AuthEvent.objects.count(), 3)
 
-# Create your tests here.
+    def test_prune(self):
+        old = AuthEvent.objects.create(user=self.user, event=AuthEvent.LOGIN, created_at=timezone.now() - timedelta(days=400))
+        recent = AuthEvent.objects.create(user=self.user, event=AuthEvent.LOGIN)
+        call_command('prune_auth_events', days=365, batch_size=1, stdout=StringIO())
+        self.assertEqual(list(AuthEvent.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertNotEqual(old.pk, recent.pk)
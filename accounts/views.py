@@ -6,13 +6,15 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.shortcuts import render, redirect
-from django.contrib.auth import authenticate, login as django_login, logout
+from django.contrib.auth import authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.http import HttpResponseRedirect
 
 from .serializers import SignupSerializer, LoginSerializer
+from . import sessions
 from .models import Profile
+from .tasks import shrink_profile_image
 from .forms import ProfileForm  # if you're using forms
 from django.contrib.auth import get_user_model
 
@@ -39,7 +41,7 @@ class SignupView(views.APIView):
         serializer = SignupSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            django_login(request, user)
+            sessions.login(request, user)
             Profile.objects.get_or_create(user=user)
             refresh = RefreshToken.for_user(user)
 
@@ -59,6 +61,8 @@ class SignupView(views.APIView):
 
 
 class LoginView(views.APIView):
+    permission_classes = [AllowAny]
+
     def get(self, request):
         return render(request, 'auth.html')
 
@@ -75,7 +79,7 @@ class LoginView(views.APIView):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            django_login(request, user)
+            sessions.login(request, user)
             refresh = RefreshToken.for_user(user)
 
             if request.query_params.get("redirect") == "true":
@@ -92,6 +96,8 @@ class LoginView(views.APIView):
 
 
 class AuthView(APIView):
+    permission_classes = [AllowAny]
+
     @swagger_auto_schema(
         operation_summary="Signup or Login and Render auth.html",
         operation_description="""
@@ -122,7 +128,7 @@ class AuthView(APIView):
             serializer = SignupSerializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.save()
-                django_login(request, user)
+                sessions.login(request, user, session=True)
                 Profile.objects.get_or_create(user=user)
                 refresh = RefreshToken.for_user(user)
                 return render(request, 'auth.html', {
@@ -137,7 +143,7 @@ class AuthView(APIView):
             serializer = LoginSerializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.validated_data["user"]
-                django_login(request, user)
+                sessions.login(request, user, session=True)
                 refresh = RefreshToken.for_user(user)
                 return render(request, 'auth.html', {
                     "message": "Login successful",
@@ -153,16 +159,15 @@ class AuthView(APIView):
 @login_required
 def profile_page(request):
     profile, _ = Profile.objects.get_or_create(user=request.user)
+    profile.user = request.user  # reuse the loaded user instead of fetching it again
 
     if request.method == 'POST':
         form = ProfileForm(request.POST, request.FILES, instance=profile, user=request.user)
         if form.is_valid():
+            # ProfileForm.save() also saves first_name/last_name on the user
             form.save()
-
-            # Update first_name and last_name on the User model if changed
-            request.user.first_name = form.cleaned_data.get('first_name', request.user.first_name)
-            request.user.last_name = form.cleaned_data.get('last_name', request.user.last_name)
-            request.user.save()
+            if 'profile_image' in form.changed_data and profile.profile_image:
+                shrink_profile_image.delay(profile.pk)
 
             return redirect('home')  # Redirect to homepage
     else:
@@ -0,0 +1,149 @@
+"""
+Database routing between the primary and an optional read replica.
+
+When ``DATABASES`` has a ``replica`` alias (see ``DATABASE_REPLICA_URL`` in
+settings), reads of the catalog models go to it; everything else, and every
+write, uses ``default``. Views can override where all of their reads go
+with ``use_replica`` / ``use_primary``.
+
+Reads stay on the primary:
+
+* inside a transaction on the primary, so checkout's ``select_for_update``
+  locks and reads see the rows the transaction is working on;
+* for the rest of a request (or task) once it has written anything, so it
+  reads its own writes;
+* for ``REPLICA_PIN_SECONDS`` after a request that wrote, via a cookie set by
+  ``PrimaryPinningMiddleware``, so the page a form redirects to doesn't show
+  the replica's stale copy;
+* for the rest of a request that called ``pin_to_primary`` (the catalog page
+  cache does for a while after the catalog changed).
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+REPLICA_PIN_COOKIE = 'db_pin'
+
+CATALOG_MODELS = {'store.product', 'store.relatedproductlist'}
+
+# Whether reads are pinned to the primary (by the cookie or an earlier write
+# in this context), whether this context wrote, and the read override of the
+# current view.
+_pinned = ContextVar('db_pinned', default=False)
+_wrote = ContextVar('db_wrote', default=False)
+_read_alias = ContextVar('db_read_alias', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.settings
+
+
+def start_request(pinned=False):
+    """Reset the routing state at the start of a request."""
+    _pinned.set(pinned)
+    _wrote.set(False)
+
+
+def pinned_to_primary():
+    return _pinned.get() or _wrote.get()
+
+
+def pin_to_primary():
+    """Send the rest of this request's reads to the primary."""
+    _pinned.set(True)
+
+
+def wrote():
+    return _wrote.get()
+
+
+def reads_from(alias):
+    """
+    View decorator sending every read the view makes to ``alias``. Pinning
+    and transactions still take precedence, and without a configured
+    replica everything uses the primary anyway.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(*args, **kwargs):
+                token = _read_alias.set(alias)
+                try:
+                    return await view(*args, **kwargs)
+                finally:
+                    _read_alias.reset(token)
+            return wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = _read_alias.set(alias)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return wrapper
+    return decorator
+
+
+use_primary = reads_from(DEFAULT_DB_ALIAS)
+use_replica = reads_from(REPLICA_DB_ALIAS)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not replica_configured()
+            or pinned_to_primary()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        alias = _read_alias.get()
+        if alias is not None:
+            return alias
+        if model._meta.label_lower in CATALOG_MODELS:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """Carry read-your-writes across requests with a short-lived cookie."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start_request(pinned=REPLICA_PIN_COOKIE in request.COOKIES)
+        return self.set_pin_cookie(self.get_response(request))
+
+    async def __acall__(self, request):
+        start_request(pinned=REPLICA_PIN_COOKIE in request.COOKIES)
+        return self.set_pin_cookie(await self.get_response(request))
+
+    def set_pin_cookie(self, response):
+        if wrote() and replica_configured():
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
@@ -2,6 +2,9 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -33,6 +36,7 @@ INSTALLED_APPS = [
     'store',
     'user',
     'accounts',
+    'taskqueue',
 
     'crispy_forms',
     'crispy_tailwind',
@@ -43,6 +47,7 @@ CRISPY_TEMPLATE_PACK = "tailwind"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.routers.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -74,17 +79,112 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
+# DATABASE_URL selects the primary database (Render provides a PostgreSQL
+# one); without it a local SQLite file is used. DATABASE_REPLICA_URL adds a
+# read-only 'replica' alias that catalog reads are routed to (core/routers.py);
+# locally a copy of db.sqlite3 can stand in for it.
+#
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and checked
+# before reuse, so a gunicorn worker doesn't reconnect on every request.
+# Under ASGI (uvicorn workers, see render.yaml) every async request runs its
+# queries on a fresh thread, so persistent connections pile up instead of
+# being reused; use the pool there. With DATABASE_POOL=true PostgreSQL
+# connections come from a psycopg 3 pool in each process instead, and are
+# handed back to it when a request finishes.
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '').lower() == 'true'
+DATABASE_POOL_MIN_SIZE = int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10))
+
+# Local SQLite: WAL lets page views read while a request writes, and
+# IMMEDIATE transactions take the write lock up front instead of failing
+# with "database is locked" when a read transaction tries to upgrade.
+SQLITE_OPTIONS = {
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
+
+
+def _database(url):
+    config = dj_database_url.parse(url, conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=True)
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['OPTIONS'] = {**SQLITE_OPTIONS, **config.get('OPTIONS', {})}
+    elif config['ENGINE'] == 'django.db.backends.postgresql' and DATABASE_POOL:
+        # The pool owns the connections; Django must not keep its own.
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+        }
+    return config
+
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': _database(os.environ.get('DATABASE_URL') or f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+}
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = {
+        **_database(os.environ['DATABASE_REPLICA_URL']),
+        # Tests run against the primary's test database
+        'TEST': {'MIRROR': 'default'},
     }
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+TEST_RUNNER = 'core.testing.TestRunner'
+# After a request writes, the same client reads from the primary for this
+# many seconds (longer than the replica usually lags).
+REPLICA_PIN_SECONDS = 5
+
+# Cache
+# The cart cache (store/cart.py) holds unsaved cart changes, and the catalog
+# version (store/page_cache.py) is bumped from the admin, imports and the task
+# worker, so production must use a cache shared by all processes: set
+# REDIS_URL. The local-memory fallback is private to each process and is only
+# good for development. Render sets RENDER on every service.
+if not os.environ.get("REDIS_URL") and (not DEBUG or os.environ.get("RENDER")):
+    raise ImproperlyConfigured("REDIS_URL must be set in production; see CACHES in core/settings.py.")
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cart write-behind: flush pending changes after this many changed lines or
+# after this many seconds, whichever comes first. Carts that nobody reads or
+# changes again are flushed by `manage.py flush_carts` (a cron job on Render).
+CART_FLUSH_THRESHOLD = 10
+CART_FLUSH_INTERVAL = 30
+
+# Background tasks are stored in the database and run by `manage.py task_worker`.
+# Media files are on the web service's disk (STORAGES below), so tasks that
+# read them are on the 'media' queue, which a worker on the web service runs;
+# see render.yaml.
+TASK_BROKER = 'taskqueue.brokers.DatabaseBroker'
+TASK_WORKER_CONCURRENCY = int(os.environ.get('TASK_WORKER_CONCURRENCY', 4))
+
+# Password hashing. PASSWORD_HASHER picks the algorithm for new hashes
+# ('argon2', 'bcrypt' or 'pbkdf2'); hashes made with the others still verify
+# and are upgraded transparently the next time the user logs in.
+_PASSWORD_HASHERS = {
+    'argon2': 'user.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
 }
-# Optional: for PostgreSQL on Render
-# import dj_database_url
-# DATABASES = {
-#     'default': dj_database_url.config(default=os.environ.get("DATABASE_URL"))
-# }
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19 * 1024))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -127,15 +227,24 @@ AUTH_USER_MODEL = "user.User"
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/homepage/'
 
+# Only browser logins get a session (API clients use JWTs, see
+# accounts/sessions.py). Sessions are read through the cache and written
+# through to the database.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # REST Framework & JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -152,6 +261,9 @@ SIMPLE_JWT = {
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
 }
+# Per-process cache of users authenticated by JWT (see user.authentication)
+JWT_USER_CACHE_SIZE = 1024
+JWT_USER_CACHE_TTL = 60
 
 # Swagger settings
 SWAGGER_SETTINGS = {
@@ -176,6 +288,15 @@ DJOSER = {
     'SEND_ACTIVATION_EMAIL': True,
     'LOGOUT_ON_PASSWORD_CHANGE': True,
     'SERIALIZERS': {},
+    # Rendered in the request, delivered by the task worker
+    'EMAIL': {
+        'activation': 'accounts.email.ActivationEmail',
+        'confirmation': 'accounts.email.ConfirmationEmail',
+        'password_reset': 'accounts.email.PasswordResetEmail',
+        'password_changed_confirmation': 'accounts.email.PasswordChangedConfirmationEmail',
+        'username_changed_confirmation': 'accounts.email.UsernameChangedConfirmationEmail',
+        'username_reset': 'accounts.email.UsernameResetEmail',
+    },
 }
 
 # CORS
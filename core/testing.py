@@ -0,0 +1,65 @@
+import unittest
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner, ParallelTestSuite, RemoteTestResult, RemoteTestRunner
+from django.test.utils import CaptureQueriesContext
+
+
+class AuthLogResultMixin:
+    """
+    Start and end every test with an empty auth event buffer, so events
+    logged by one test (force_login() logs one) aren't written during
+    another, or into the real database when the process exits.
+    """
+
+    def startTest(self, test):
+        from accounts import auth_log
+
+        auth_log.buffer.clear()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        from accounts import auth_log
+
+        auth_log.buffer.clear()
+        super().stopTest(test)
+
+
+class AuthLogRemoteTestRunner(RemoteTestRunner):
+    resultclass = type('AuthLogRemoteTestResult', (AuthLogResultMixin, RemoteTestResult), {})
+
+
+class AuthLogParallelTestSuite(ParallelTestSuite):
+    runner_class = AuthLogRemoteTestRunner
+
+
+class TestRunner(DiscoverRunner):
+    """The test runner (``TEST_RUNNER``): ``DiscoverRunner`` with ``AuthLogResultMixin``, also under --parallel."""
+    parallel_test_suite = AuthLogParallelTestSuite
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type(f'AuthLog{resultclass.__name__}', (AuthLogResultMixin, resultclass), {})
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for pinning how many SQL queries a block may run.
+
+    Unlike ``assertNumQueries`` the budget is an upper bound, so a view that
+    gets cheaper keeps passing while one that starts issuing a query per row
+    fails with the offending SQL listed.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{executed} queries executed, budget is {budget}:\n{queries}')
@@ -12,10 +12,12 @@ class ProductAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
+    raw_id_fields = ('product',)
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'created_at', 'is_paid')
+    list_display = ('id', 'user', 'created_at', 'is_paid', 'total')
+    list_select_related = ('user',)
     list_filter = ('is_paid', 'created_at')
     search_fields = ('user__email',)
     inlines = [OrderItemInline]
@@ -23,15 +25,18 @@ class OrderAdmin(admin.ModelAdmin):
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 1
+    raw_id_fields = ('product',)
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ('user',)
+    list_select_related = ('user',)
     inlines = [CartItemInline]
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('cart', 'product', 'quantity')
+    list_select_related = ('cart__user', 'product')
 
 from django.contrib import admin
 from .models import PaymentMethod, DeliveryService
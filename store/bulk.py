@@ -0,0 +1,278 @@
+"""
+Bulk export and import of catalog data.
+
+Exports stream ``Product`` and ``Order`` rows as CSV or NDJSON (one JSON
+object per line). Rows are read with ``iterator(chunk_size=...)`` and encoded
+a chunk at a time, so memory use doesn't grow with the table; the same
+generator feeds the ``export_data`` command and the export endpoints'
+``StreamingHttpResponse``. The web service runs under ASGI, where Django
+reads a sync iterator into a list before sending it, so the endpoints get
+an async iterator (``aexport``) that fetches each chunk in a worker thread.
+
+Imports read the same formats and upsert products: a row with an ``id``
+updates that product, a row without one creates a product. Rows are
+validated with ``ProductImportSerializer`` and written with
+``bulk_create(update_conflicts=True)``, one statement per batch and set of
+columns the rows have, so columns a row leaves out are kept as they are.
+Invalid rows are reported
+by line number and skipped. ``bulk_create`` doesn't send ``post_save``, so
+each batch does what the ``Product`` signal receivers would: index the rows
+for search, drop stale related-product lists and facet counts, and bump the
+catalog version.
+
+``save_products`` writes the validated items of the batch endpoint
+(``ProductBatchSerializer``) the same way.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+from . import facets, page_cache, related, search
+from .models import Product, RelatedProductList
+from .serializers import ProductImportSerializer
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+IMPORT_BATCH_SIZE = getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# (column name, lookup) of each exported model
+PRODUCT_COLUMNS = [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('price', 'price'),
+    ('category', 'category'),
+    ('stock', 'stock'),
+    ('image', 'image'),
+    ('created_at', 'created_at'),
+]
+ORDER_COLUMNS = [
+    ('id', 'id'),
+    ('user_email', 'user__email'),
+    ('created_at', 'created_at'),
+    ('is_paid', 'is_paid'),
+    ('payment_method', 'payment_method__name'),
+    ('delivery_service', 'delivery_service__name'),
+    ('delivery_address', 'delivery_address'),
+    ('delivery_postal_code', 'delivery_postal_code'),
+    ('delivery_country', 'delivery_country'),
+    ('subtotal', 'subtotal'),
+    ('delivery_fee', 'delivery_fee'),
+    ('total', 'total'),
+]
+
+UPDATE_FIELDS = [name for name in ProductImportSerializer.Meta.fields if name != 'id']
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    # (line number, serializer errors) of each skipped row
+    errors: list = field(default_factory=list)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Export
+
+class Echo:
+    """A file-like object whose ``write`` returns what was written, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def export(queryset, columns, file_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield ``queryset`` as ``file_format`` text, ``chunk_size`` rows at a time."""
+    names = [name for name, _ in columns]
+    rows = queryset.order_by('pk').values_list(*(lookup for _, lookup in columns))
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        encode = writer.writerow
+        yield writer.writerow(names)
+    else:
+        def encode(row):
+            return json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+    for chunk in batched(rows.iterator(chunk_size=chunk_size), chunk_size):
+        yield ''.join(encode(row) for row in chunk)
+
+
+async def aexport(queryset, columns, file_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """``export`` as an async iterator; the queries and encoding run in a worker thread."""
+    chunks = export(queryset, columns, file_format, chunk_size)
+    while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+        yield chunk
+
+
+def export_response(queryset, columns, file_format, filename):
+    # Pick the database now: the rows are read after the view has returned,
+    # outside any use_replica/use_primary override.
+    queryset = queryset.using(queryset.db)
+    response = StreamingHttpResponse(aexport(queryset, columns, file_format), content_type=FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+# Import
+
+def read_rows(file, file_format):
+    """Yield (line number, row dict) for each record of ``file``; malformed NDJSON lines as None."""
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Validate and upsert (line number, row dict) pairs, ``batch_size`` rows at a time."""
+    result = ImportResult()
+    child = ProductImportSerializer(many=True).child
+    for batch in batched(rows, batch_size):
+        valid = []
+        for number, row in batch:
+            if row is None:
+                result.errors.append((number, {'non_field_errors': ["Not a JSON object."]}))
+                continue
+            if row.get('id') == '':
+                # An empty CSV cell
+                row = {key: value for key, value in row.items() if key != 'id'}
+            try:
+                valid.append((number, child.run_validation(row)))
+            except ValidationError as exc:
+                result.errors.append((number, exc.detail))
+        created, updated = upsert_products(valid, result.errors)
+        result.created += created
+        result.updated += updated
+    return result
+
+
+def upsert_products(rows, errors):
+    """
+    Write validated (line number, data) rows with INSERT ... ON CONFLICT
+    statements, one per set of fields the updating rows have; an update
+    only writes the fields its row has. Rows naming a product that doesn't
+    exist are added to ``errors``; of rows naming the same product, the last
+    wins. Returns the number of products (created, updated).
+    """
+    ids = {data['id'] for _, data in rows if data.get('id') is not None}
+    existing = set(Product.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+    new, changed = [], {}
+    for number, data in rows:
+        pk = data.get('id')
+        if pk is None:
+            new.append(Product(**data))
+        elif pk in existing:
+            changed[pk] = data
+        else:
+            errors.append((number, {'id': [f"No product with id {pk}."]}))
+    by_fields = {}
+    for data in changed.values():
+        fields = tuple(name for name in UPDATE_FIELDS if name in data)
+        by_fields.setdefault(fields, []).append(Product(**data))
+    if not new and not changed:
+        return 0, 0
+
+    with transaction.atomic():
+        if new:
+            Product.objects.bulk_create(new)
+        for fields, products in by_fields.items():
+            if fields:
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=list(fields),
+                )
+        # Index the updated rows as stored, with the fields their row left out
+        updated = list(Product.objects.filter(pk__in=list(changed))) if changed else []
+        products_changed(new + updated, list(changed))
+    return len(new), len(changed)
+
+
+def save_products(items):
+    """
+    Create the validated ``items`` without an ``id`` and apply the others to
+    their product, in a single transaction: one ``bulk_create``, and one
+    ``bulk_update`` per set of fields the updating items send. The products
+    are locked while they are updated and only the fields an item sends are
+    written, so concurrent changes to the rest (stock at checkout) are kept.
+    Returns (created, product) for each item, in order.
+    """
+    ids = [item['id'] for item in items if item.get('id') is not None]
+    with transaction.atomic():
+        existing = Product.objects.select_for_update().in_bulk(ids) if ids else {}
+        missing = [item.get('id') is not None and item['id'] not in existing for item in items]
+        if any(missing):
+            # Deleted since the batch was validated
+            raise ValidationError([
+                {'id': [f"No product with id {item['id']}."]} if gone else {}
+                for item, gone in zip(items, missing)
+            ])
+
+        results, new, by_fields = [], [], {}
+        for item in items:
+            data = {name: value for name, value in item.items() if name != 'id'}
+            if item.get('id') is None:
+                product = Product(**data)
+                new.append(product)
+            else:
+                product = existing[item['id']]
+                for name, value in data.items():
+                    setattr(product, name, value)
+                by_fields.setdefault(tuple(sorted(data)), []).append(product)
+            results.append((item.get('id') is None, product))
+
+        if new:
+            Product.objects.bulk_create(new)
+        for fields, products in by_fields.items():
+            if fields:
+                Product.objects.bulk_update(products, list(fields))
+        changed = [product for products in by_fields.values() for product in products]
+        products_changed(new + changed, [product.pk for product in changed])
+    return results
+
+
+def products_changed(products, updated_ids):
+    """
+    Do what the ``Product`` post_save receivers do, for a bulk write. The
+    caches are only touched once the write commits, so a concurrent request
+    can't refill them from rows that aren't committed, or are rolled back.
+    """
+    search.index_products([product for product in products if product.pk is not None])
+    if updated_ids:
+        RelatedProductList.objects.filter(product_id__in=updated_ids).delete()
+    transaction.on_commit(lambda: invalidate_caches(updated_ids))
+
+
+def invalidate_caches(updated_ids):
+    if updated_ids:
+        cache.delete_many([related.cache_key(pk) for pk in updated_ids])
+    facets.invalidate()
+    page_cache.bump_catalog_version()
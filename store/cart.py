@@ -0,0 +1,437 @@
+"""
+Server-side cart cache with write-behind to ``Cart``/``CartItem``.
+
+Each user's cart is kept in the Django cache as a compact dict: product id ->
+quantity, plus a snapshot of the product fields the cart pages render (name,
+price, image and its variants, category). Cart pages are served entirely from that entry.
+
+Changes only touch the cache and are remembered as pending: additions as
+increments, quantity changes and removals as the line's new value. Pending
+lines are written back to ``CartItem`` once ``CART_FLUSH_THRESHOLD`` of them
+have piled up, once the oldest is older than ``CART_FLUSH_INTERVAL``
+seconds (checked whenever the cart is read or changed), before checkout,
+and by the ``flush_carts`` management command, which render.yaml runs every
+minute for carts nobody is looking at.
+Each kind is written with one ``INSERT ... ON CONFLICT DO UPDATE`` statement
+(see ``upsert_lines``), increments as ``quantity = quantity + excluded.quantity``
+so that additions are never lost to a concurrent writer.
+
+Changes to one cart are serialized with a cache-based lock. A request that
+can't get it in time writes its own change straight to the database and
+flags the cart, and whoever next holds the lock saves the pending changes
+and reloads the cart from the database.
+
+The cache backing this must be shared by every worker process, otherwise
+workers would see different carts; see ``CACHES`` in settings.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import IntegrityError, connections, router, transaction
+
+from .models import Cart, CartItem, Product
+
+CART_CACHE_ALIAS = getattr(settings, 'CART_CACHE_ALIAS', 'default')
+CART_CACHE_TIMEOUT = getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24)
+CART_FLUSH_THRESHOLD = getattr(settings, 'CART_FLUSH_THRESHOLD', 10)
+CART_FLUSH_INTERVAL = getattr(settings, 'CART_FLUSH_INTERVAL', 30)
+# How long a product snapshot is trusted before prices are re-read.
+CART_SNAPSHOT_TTL = getattr(settings, 'CART_SNAPSHOT_TTL', 5 * 60)
+
+DIRTY_CARTS_KEY = 'cart:dirty'
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 1.0
+
+SNAPSHOT_FIELDS = ('name', 'price', 'image', 'category', 'image_variants')
+
+
+class CartLine:
+    """A cart row as the templates see it; mirrors ``CartItem``."""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def total_price(self):
+        return self.product.price * self.quantity
+
+
+class CachedCart:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.key = f'cart:{user_id}'
+        # Set when a change was written to the database without the lock
+        self.reload_key = f'{self.key}:reload'
+        self.cache = caches[CART_CACHE_ALIAS]
+        # True or False inside _locked(), None outside it
+        self._holding_lock = None
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(user.pk)
+
+    # Reads
+
+    def lines(self):
+        state = self._state()
+        return [
+            CartLine(self._product(product_id, state['products'][product_id]), quantity)
+            for product_id, quantity in state['lines'].items()
+        ]
+
+    def line(self, product_id):
+        state = self._state()
+        if product_id not in state['lines']:
+            return None
+        return CartLine(self._product(product_id, state['products'][product_id]), state['lines'][product_id])
+
+    def total_price(self):
+        return sum((line.total_price for line in self.lines()), 0)
+
+    def __len__(self):
+        return len(self._state()['lines'])
+
+    # Writes
+
+    def add(self, product_id, quantity=1):
+        """Add ``quantity`` of a product. Raises ``Product.DoesNotExist``."""
+        with self._locked() as state:
+            if product_id not in state['products']:
+                state['products'].update(self._snapshots([product_id]))
+                if product_id not in state['products']:
+                    raise Product.DoesNotExist(f"Product {product_id} not found")
+            if not self._holding_lock:
+                try:
+                    self._write_through(state, lambda cart_id: upsert_lines(cart_id, {product_id: quantity}, increment=True))
+                except IntegrityError:
+                    raise Product.DoesNotExist(f"Product {product_id} not found")
+                return
+            state['lines'][product_id] = state['lines'].get(product_id, 0) + quantity
+            if product_id not in state['dirty']:
+                # A pending new value for the line already includes this
+                state['added'][product_id] = state['added'].get(product_id, 0) + quantity
+            self._mark_pending(state)
+
+    def set_quantity(self, product_id, quantity):
+        with self._locked() as state:
+            if product_id not in state['lines']:
+                return False
+            if not self._holding_lock:
+                self._write_through(state, lambda cart_id: upsert_lines(cart_id, {product_id: quantity}))
+                return True
+            state['lines'][product_id] = quantity
+            self._mark_dirty(state, product_id)
+            return True
+
+    def remove(self, product_id):
+        with self._locked() as state:
+            if product_id not in state['lines']:
+                return False
+            if not self._holding_lock:
+                self._write_through(
+                    state, lambda cart_id: CartItem.objects.filter(cart_id=cart_id, product_id=product_id).delete()
+                )
+                return True
+            del state['lines'][product_id]
+            state['products'].pop(product_id, None)
+            self._mark_dirty(state, product_id)
+            return True
+
+    def flush(self):
+        """Write pending changes back to the database."""
+        # Only the lock holder may write the pending additions, so wait for a
+        # stuck lock to expire rather than give up.
+        with self._locked(flush=False, wait=LOCK_TIMEOUT) as state:
+            if self._holding_lock:
+                self._write_back(state)
+            elif self._pending(state):
+                # flush_dirty_carts has unregistered it; the next run retries
+                self._register_dirty()
+
+    def invalidate(self):
+        """Drop the cached cart; the next read reloads it from the database."""
+        self.cache.delete(self.key)
+
+    def product_id_for_item(self, item_id):
+        """
+        Resolve a ``CartItem`` id (as used by the item-id based endpoints) to
+        a product id. Pending changes are flushed first so the row exists.
+        Raises ``CartItem.DoesNotExist``.
+        """
+        self.flush()
+        return CartItem.objects.values_list('product_id', flat=True).get(id=item_id, cart__user_id=self.user_id)
+
+    # Internals
+
+    def _state(self):
+        entries = self.cache.get_many([self.key, self.reload_key])
+        if self.reload_key in entries and self._holding_lock is None:
+            # Reload under the lock; if it's busy, the holder will
+            with self._locked(flush=False, wait=0) as state:
+                return state
+        state = entries.get(self.key)
+        if state is None:
+            state = self._load()
+            self.cache.set(self.key, state, CART_CACHE_TIMEOUT)
+        elif 'added' not in state:
+            # Cached before additions were kept apart; none are pending then
+            state['added'] = {}
+        if time.time() - state['checked_at'] > CART_SNAPSHOT_TTL:
+            self._refresh_snapshots(state)
+            self.cache.set(self.key, state, CART_CACHE_TIMEOUT)
+        if self._holding_lock is None and self._should_flush(state):
+            # Only read since its changes became due; save them now
+            with self._locked(wait=0) as state:
+                return state
+        return state
+
+    def _load(self):
+        rows = CartItem.objects.filter(cart__user_id=self.user_id).values_list(
+            'cart_id', 'product_id', 'quantity', *(f'product__{name}' for name in SNAPSHOT_FIELDS)
+        ).order_by('id')
+        state = {
+            'cart_id': None,
+            'lines': {},
+            'products': {},
+            # Lines with a pending new value, and pending additions to others
+            'dirty': set(),
+            'added': {},
+            'dirty_since': None,
+            'checked_at': time.time(),
+        }
+        for cart_id, product_id, quantity, *snapshot in rows:
+            state['cart_id'] = cart_id
+            state['lines'][product_id] = quantity
+            state['products'][product_id] = snapshot
+        return state
+
+    def _snapshots(self, product_ids):
+        rows = Product.objects.filter(pk__in=product_ids).values_list('pk', *SNAPSHOT_FIELDS)
+        return {pk: list(snapshot) for pk, *snapshot in rows}
+
+    def _refresh_snapshots(self, state):
+        state['products'] = self._snapshots(list(state['lines']))
+        # Lines whose product was deleted are already gone from the database.
+        for product_id in set(state['lines']) - set(state['products']):
+            del state['lines'][product_id]
+            state['dirty'].discard(product_id)
+            state['added'].pop(product_id, None)
+        state['checked_at'] = time.time()
+
+    @staticmethod
+    def _product(product_id, snapshot):
+        return Product(id=product_id, **dict(zip(SNAPSHOT_FIELDS, snapshot)))
+
+    def _mark_dirty(self, state, product_id):
+        state['added'].pop(product_id, None)
+        state['dirty'].add(product_id)
+        self._mark_pending(state)
+
+    def _mark_pending(self, state):
+        if state['dirty_since'] is None:
+            state['dirty_since'] = time.time()
+            self._register_dirty()
+
+    @staticmethod
+    def _pending(state):
+        return len(state['dirty']) + len(state['added'])
+
+    def _should_flush(self, state):
+        if not self._pending(state):
+            return False
+        return (
+            self._pending(state) >= CART_FLUSH_THRESHOLD
+            or time.time() - state['dirty_since'] >= CART_FLUSH_INTERVAL
+        )
+
+    def _write_back(self, state):
+        if not self._pending(state):
+            return
+        dirty = state['dirty']
+        kept = {product_id: state['lines'][product_id] for product_id in dirty if product_id in state['lines']}
+        removed = dirty - set(kept)
+        try:
+            with transaction.atomic():
+                cart_id = state['cart_id'] or Cart.objects.get_or_create(user_id=self.user_id)[0].pk
+                if removed:
+                    CartItem.objects.filter(cart_id=cart_id, product_id__in=removed).delete()
+                saved = upsert_lines(cart_id, kept)
+                saved.update(upsert_lines(cart_id, state['added'], increment=True))
+        except IntegrityError:
+            # A product was deleted while its line was pending; start over
+            # from what the database has.
+            self.cache.delete(self.key)
+            state.update(self._load())
+            return
+        # Another writer may have added to the same lines meanwhile
+        state['lines'].update(saved)
+        state['cart_id'] = cart_id
+        state['dirty'] = set()
+        state['added'] = {}
+        state['dirty_since'] = None
+
+    def _write_through(self, state, write):
+        """
+        Apply a change without the lock: ``write(cart_id)`` writes it to the
+        database and the cart is flagged for a reload. The cached state is
+        the lock holder's and is left alone; its pending changes are saved
+        by whoever reloads.
+        """
+        with transaction.atomic():
+            cart_id = state['cart_id'] or Cart.objects.get_or_create(user_id=self.user_id)[0].pk
+            write(cart_id)
+        self.cache.set(self.reload_key, 1, CART_CACHE_TIMEOUT)
+
+    def _reload(self, state):
+        """Save ``state``'s pending changes and return the cart as the database has it."""
+        self.cache.delete(self.reload_key)
+        self._write_back(state)
+        return self._load()
+
+    def _register_dirty(self):
+        dirty_carts.add(self.user_id)
+
+    @contextmanager
+    def _locked(self, flush=True, wait=LOCK_WAIT):
+        """
+        Serialize read-modify-write cycles on one cart (double clicks, parallel
+        tabs) with a cache-based lock, then save the state back, flushing it
+        to the database if it is due.
+
+        If the lock can't be had within ``wait`` seconds, ``_holding_lock``
+        is false inside the block: the state may be read but not changed,
+        and a change must go through ``_write_through``.
+        """
+        lock_key = f'{self.key}:lock'
+        deadline = time.monotonic() + wait
+        acquired = self.cache.add(lock_key, 1, LOCK_TIMEOUT)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.01)
+            acquired = self.cache.add(lock_key, 1, LOCK_TIMEOUT)
+        self._holding_lock = acquired
+        try:
+            state = self._state()
+            if acquired and self.cache.get(self.reload_key):
+                state = self._reload(state)
+            yield state
+            if not acquired:
+                return
+            if flush and self._should_flush(state):
+                self._write_back(state)
+            self.cache.set(self.key, state, CART_CACHE_TIMEOUT)
+        finally:
+            self._holding_lock = None
+            if acquired:
+                self.cache.delete(lock_key)
+
+
+def upsert_lines(cart_id, quantities, increment=False):
+    """
+    Write ``quantities`` (product id -> quantity) to the cart's lines in one
+    ``INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE`` statement,
+    which SQLite and PostgreSQL both support. With ``increment`` the
+    quantities are added to existing lines instead of replacing them.
+
+    Returns the resulting quantity of each line where the database can
+    return rows from the insert, else an empty dict.
+    """
+    if not quantities:
+        return {}
+    connection = connections[router.db_for_write(CartItem)]
+    quote = connection.ops.quote_name
+    table = quote(CartItem._meta.db_table)
+    cart, product, quantity = (quote(CartItem._meta.get_field(name).column) for name in ('cart', 'product', 'quantity'))
+
+    new_quantity = f'{table}.{quantity} + excluded.{quantity}' if increment else f'excluded.{quantity}'
+    sql = (
+        f'INSERT INTO {table} ({cart}, {product}, {quantity}) '
+        f'VALUES {", ".join(["(%s, %s, %s)"] * len(quantities))} '
+        f'ON CONFLICT ({cart}, {product}) DO UPDATE SET {quantity} = {new_quantity}'
+    )
+    params = [value for product_id, count in quantities.items() for value in (cart_id, product_id, count)]
+    returning = connection.features.can_return_rows_from_bulk_insert
+    if returning:
+        sql += f' RETURNING {product}, {quantity}'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return dict(cursor.fetchall()) if returning else {}
+
+
+class DirtyCarts:
+    """
+    The ids of users whose cart has pending changes, as one set in the cache.
+
+    On Redis the set is changed with SADD/SREM, so parallel requests don't
+    overwrite each other's entries. Django's cache API has no set commands,
+    so those go through a redis-py client of their own, connected to the
+    cache's (first) server. Any other backend is the per-process local-memory
+    fallback (see settings), where a process-wide lock around get and set
+    does the same.
+    """
+
+    def __init__(self, alias=CART_CACHE_ALIAS):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._client = None
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _redis(self):
+        if not isinstance(self.cache, RedisCache):
+            return None, None
+        if self._client is None:
+            import redis
+
+            location = settings.CACHES[self.alias]['LOCATION']
+            servers = location.split(',') if isinstance(location, str) else location
+            self._client = redis.Redis.from_url(servers[0])
+        return self._client, self.cache.make_and_validate_key(DIRTY_CARTS_KEY)
+
+    def add(self, user_id):
+        client, key = self._redis()
+        if client is not None:
+            client.sadd(key, user_id)
+            return
+        with self._lock:
+            user_ids = self.cache.get(DIRTY_CARTS_KEY) or set()
+            self.cache.set(DIRTY_CARTS_KEY, user_ids | {user_id}, None)
+
+    def discard(self, user_id):
+        client, key = self._redis()
+        if client is not None:
+            client.srem(key, user_id)
+            return
+        with self._lock:
+            user_ids = self.cache.get(DIRTY_CARTS_KEY) or set()
+            self.cache.set(DIRTY_CARTS_KEY, user_ids - {user_id}, None)
+
+    def members(self):
+        client, key = self._redis()
+        if client is not None:
+            return {int(user_id) for user_id in client.smembers(key)}
+        return set(self.cache.get(DIRTY_CARTS_KEY) or ())
+
+
+dirty_carts = DirtyCarts()
+
+
+def flush_dirty_carts():
+    """Flush every cart with pending changes. Returns how many were flushed."""
+    user_ids = dirty_carts.members()
+    for user_id in user_ids:
+        # Unregistered first: a change made while this cart is being flushed
+        # registers it again instead of being dropped with it.
+        dirty_carts.discard(user_id)
+        try:
+            CachedCart(user_id).flush()
+        except Exception:
+            dirty_carts.add(user_id)
+            raise
+    return len(user_ids)
@@ -0,0 +1,122 @@
+"""
+Checkout: turn a user's cart into an order in one transaction.
+
+The whole checkout is a fixed number of queries regardless of cart size:
+the cart lines and the product rows are read once, stock is decremented with
+one conditional UPDATE per batch of products, and the order lines are written
+with a single bulk INSERT.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from . import facets
+from .models import CartItem, Order, OrderItem, Product
+
+STOCK_UPDATE_BATCH_SIZE = 100
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    def __init__(self):
+        super().__init__("Your cart is empty.")
+
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f"Not enough stock for: {names}")
+
+
+def place_order(cart, **order_fields):
+    """
+    Create an ``Order`` from ``cart``, decrement stock and empty the cart.
+
+    ``order_fields`` are passed to ``Order`` (payment method, delivery
+    details). Raises ``EmptyCart`` or ``InsufficientStock``, in which case
+    nothing is written.
+    """
+    with transaction.atomic():
+        quantities = defaultdict(int)
+        for product_id, quantity in cart.items.values_list('product_id', 'quantity'):
+            quantities[product_id] += quantity
+        if not quantities:
+            raise EmptyCart()
+
+        products = lock_products(quantities)
+        short = [
+            product for product in products.values()
+            if product.stock < quantities[product.pk]
+        ]
+        if short:
+            raise InsufficientStock(short)
+
+        decrement_stock(quantities)
+        sold_out = [products[product_id] for product_id, quantity in quantities.items() if products[product_id].stock == quantity]
+        if sold_out:
+            transaction.on_commit(lambda: facets.products_sold_out(sold_out))
+
+        subtotal = sum(products[product_id].price * quantity for product_id, quantity in quantities.items())
+        delivery_service = order_fields.get('delivery_service')
+        delivery_fee = delivery_service.price if delivery_service else Decimal('0.00')
+        order = Order.objects.create(
+            user_id=cart.user_id,
+            subtotal=subtotal,
+            delivery_fee=delivery_fee,
+            total=subtotal + delivery_fee,
+            **order_fields,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=product_id,
+                product_name=products[product_id].name,
+                quantity=quantity,
+                unit_price=products[product_id].price,
+            )
+            for product_id, quantity in quantities.items()
+        ])
+        cart.items.all().delete()
+
+    return order
+
+
+def lock_products(quantities):
+    """
+    Fetch the products being bought, locking their rows until the end of the
+    transaction on backends that support ``SELECT ... FOR UPDATE``. Rows are
+    locked in primary key order so concurrent checkouts can't deadlock.
+    """
+    products = Product.objects.filter(pk__in=quantities).only('id', 'name', 'price', 'stock', 'category').order_by('pk')
+    if transaction.get_connection(products.db).features.has_select_for_update:
+        products = products.select_for_update()
+    return {product.pk: product for product in products}
+
+
+def decrement_stock(quantities):
+    """
+    Subtract ``quantities`` ({product_id: quantity}) from stock, one UPDATE
+    per batch. Each row is only updated if it still has enough stock, so a
+    concurrent checkout that got there first makes the row count come up
+    short and the whole order is rolled back instead of overselling.
+    """
+    items = list(quantities.items())
+    for start in range(0, len(items), STOCK_UPDATE_BATCH_SIZE):
+        batch = items[start:start + STOCK_UPDATE_BATCH_SIZE]
+        condition = Q()
+        for product_id, quantity in batch:
+            condition |= Q(pk=product_id, stock__gte=quantity)
+        updated = Product.objects.filter(condition).update(
+            stock=F('stock') - Case(*[When(pk=product_id, then=quantity) for product_id, quantity in batch])
+        )
+        if updated != len(batch):
+            stale = Product.objects.filter(pk__in=[product_id for product_id, _ in batch])
+            raise InsufficientStock([
+                product for product in stale if product.stock < quantities[product.pk]
+            ])
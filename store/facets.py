@@ -0,0 +1,193 @@
+"""
+Facet counts for catalog navigation: products per category, how many of them
+are in stock, and how many fall in each price bucket.
+
+The catalog-wide summary is built with one GROUP BY and kept in the cache as
+individual counters, which the ``Product`` signal receivers (and checkout,
+when a product sells out) adjust with ``incr``, so page views never aggregate
+over the catalog. Counts for a search are aggregated over the search results,
+which are capped at ``SEARCH_RESULT_LIMIT`` rows.
+
+If a counter can't be adjusted (it expired, or the product is in a category
+the summary doesn't know) the summary is dropped and rebuilt on next read.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, When
+
+from .models import CATEGORY_CHOICES, Product
+
+FACET_CACHE_TIMEOUT = getattr(settings, 'FACET_CACHE_TIMEOUT', 60 * 60)
+# Upper bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (25, 50, 100, 250, 500)
+
+FACETS_KEY = 'facets:categories'
+
+
+def price_bucket(price):
+    return bisect_right(PRICE_BUCKETS, Decimal(price))
+
+
+def product_row(product):
+    """The part of a product the facets count: (category, in stock, price bucket)."""
+    return product.category, product.stock > 0, price_bucket(product.price)
+
+
+def empty_facet():
+    return {'count': 0, 'in_stock': 0, 'prices': [0] * (len(PRICE_BUCKETS) + 1)}
+
+
+def category_facets(queryset=None, selected_category=''):
+    """
+    Facets for a product listing: one entry per non-empty category with its
+    product and in-stock counts, and price buckets for ``selected_category``
+    (or every category). ``queryset`` narrows the counts, e.g. to search
+    results; without it the cached catalog-wide summary is used.
+    """
+    facets = summary() if queryset is None else aggregate(queryset)
+    categories = [
+        {'name': category, 'count': facet['count'], 'in_stock': facet['in_stock']}
+        for category, facet in sorted(facets.items())
+        if facet['count']
+    ]
+    if selected_category:
+        selected = [facets.get(selected_category, empty_facet())]
+    else:
+        selected = list(facets.values())
+    bounds = (None, *PRICE_BUCKETS, None)
+    price_buckets = [
+        {'min': bounds[i], 'max': bounds[i + 1], 'count': sum(facet['prices'][i] for facet in selected)}
+        for i in range(len(PRICE_BUCKETS) + 1)
+    ]
+    return {'categories': categories, 'price_buckets': price_buckets}
+
+
+def aggregate(queryset):
+    """Count ``queryset`` by category and price bucket in one query."""
+    bucket = Case(
+        *[When(price__lt=bound, then=i) for i, bound in enumerate(PRICE_BUCKETS)],
+        default=len(PRICE_BUCKETS),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=bucket)
+        .values('category', 'bucket')
+        .annotate(count=Count('pk'), in_stock=Count('pk', filter=Q(stock__gt=0)))
+    )
+    facets = {}
+    for row in rows:
+        facet = facets.setdefault(row['category'], empty_facet())
+        facet['count'] += row['count']
+        facet['in_stock'] += row['in_stock']
+        facet['prices'][row['bucket']] += row['count']
+    return facets
+
+
+# Cached summary. Category names are quoted in keys because some cache
+# backends reject spaces.
+
+def count_key(category):
+    return f'facets:{quote(category)}:count'
+
+
+def in_stock_key(category):
+    return f'facets:{quote(category)}:in_stock'
+
+
+def price_key(category, bucket):
+    return f'facets:{quote(category)}:price:{bucket}'
+
+
+def counter_keys(category):
+    return [count_key(category), in_stock_key(category)] + [
+        price_key(category, bucket) for bucket in range(len(PRICE_BUCKETS) + 1)
+    ]
+
+
+def summary():
+    """Facets for the whole catalog, from the cached counters when possible."""
+    categories = cache.get(FACETS_KEY)
+    if categories is not None:
+        keys = [key for category in categories for key in counter_keys(category)]
+        counters = cache.get_many(keys)
+        if len(counters) == len(keys):
+            return {
+                category: {
+                    'count': counters[count_key(category)],
+                    'in_stock': counters[in_stock_key(category)],
+                    'prices': [counters[price_key(category, bucket)] for bucket in range(len(PRICE_BUCKETS) + 1)],
+                }
+                for category in categories
+            }
+    return rebuild()
+
+
+def rebuild():
+    facets = aggregate(Product.objects.all())
+    # Known categories get counters even when empty so their first product
+    # can be counted without a rebuild.
+    for category, _ in CATEGORY_CHOICES:
+        facets.setdefault(category, empty_facet())
+
+    counters = {}
+    for category, facet in facets.items():
+        counters[count_key(category)] = facet['count']
+        counters[in_stock_key(category)] = facet['in_stock']
+        for bucket, count in enumerate(facet['prices']):
+            counters[price_key(category, bucket)] = count
+    cache.set_many(counters, FACET_CACHE_TIMEOUT)
+    cache.set(FACETS_KEY, sorted(facets), FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def stored_row(product_id):
+    """
+    The facet row of a product as currently saved, or None when there's no
+    summary to adjust (so saves don't pay for the lookup).
+    """
+    if product_id is None or cache.get(FACETS_KEY) is None:
+        return None
+    row = Product.objects.filter(pk=product_id).values_list('category', 'stock', 'price').first()
+    if row is None:
+        return None
+    category, stock, price = row
+    return category, stock > 0, price_bucket(price)
+
+
+def invalidate():
+    """Drop the summary, e.g. after a bulk write that bypassed the signals."""
+    cache.delete(FACETS_KEY)
+
+
+def adjust(old, new):
+    """Move one product's contribution from row ``old`` to row ``new`` (either may be None)."""
+    if old == new or cache.get(FACETS_KEY) is None:
+        return
+    try:
+        if old is not None:
+            _apply(old, -1)
+        if new is not None:
+            _apply(new, 1)
+    except ValueError:
+        invalidate()
+
+
+def products_sold_out(products):
+    """Take products whose stock just ran out off the in-stock counts."""
+    for product in products:
+        bucket = price_bucket(product.price)
+        adjust((product.category, True, bucket), (product.category, False, bucket))
+
+
+def _apply(row, delta):
+    category, in_stock, bucket = row
+    keys = [count_key(category), price_key(category, bucket)]
+    if in_stock:
+        keys.append(in_stock_key(category))
+    for key in keys:
+        cache.incr(key, delta)
@@ -0,0 +1,97 @@
+"""
+Read-only serialization of product and order lists straight from ``values()``.
+
+The list endpoints return the same JSON as ``ProductSerializer``,
+``OrderSummarySerializer`` and ``OrderSerializer``, but DRF builds a field
+tree and calls ``to_representation`` on every field of every row, which is
+what dominated those requests. Here each row is one dict built from the
+columns the output needs, with the category display names looked up in a
+precomputed map. Formatting of dates and decimals goes through the same DRF
+fields, once per value, so the output can't drift; the parity tests in
+``tests.py`` compare both paths.
+
+Writes and single-object responses keep using the DRF serializers.
+"""
+from rest_framework import serializers
+
+from .images import describe_image
+from .models import CATEGORY_CHOICES, OrderItem, Product
+from .serializers import OrderItemSerializer, OrderSerializer, ProductSerializer
+
+CATEGORY_DISPLAY = dict(CATEGORY_CHOICES)
+
+# ``values()`` columns of the list endpoints; created_at is the cursor.
+ORDER_COLUMNS = ('id', 'user_id', 'created_at', 'is_paid', 'subtotal', 'delivery_fee', 'total')
+ORDER_ITEM_COLUMNS = ('id', 'order_id', 'product_id', 'product_name', 'quantity', 'unit_price')
+
+_datetime = serializers.DateTimeField()
+_line_total = OrderItemSerializer._declared_fields['line_total']
+
+
+def product_columns(fields=None):
+    """The ``values()`` columns needed to render ``fields`` (default: all)."""
+    fields = ProductSerializer.Meta.fields if fields is None else fields
+    return ['id', 'created_at', *sorted(ProductSerializer.columns_for(fields) - {'id'})]
+
+
+def products(rows, fields=None):
+    """``ProductSerializer(..., many=True, fields=fields).data`` for ``values()`` rows."""
+    fields = [name for name in ProductSerializer.Meta.fields if fields is None or name in fields]
+    storage = Product._meta.get_field('image').storage
+    data = []
+    for row in rows:
+        product = {}
+        for name in fields:
+            if name == 'price':
+                product[name] = decimal(row['price'])
+            elif name == 'category_display':
+                product[name] = CATEGORY_DISPLAY.get(row['category'], row['category'])
+            elif name == 'images':
+                product[name] = describe_image(storage, row['image'], row['image_variants'])
+            else:
+                product[name] = row[name]
+        data.append(product)
+    return data
+
+
+def orders(rows, include_items=False):
+    """
+    ``OrderSummarySerializer(many=True).data`` for ``values(*ORDER_COLUMNS)``
+    rows, or ``OrderSerializer``'s with ``include_items``. Items are read
+    with one query.
+    """
+    data = [
+        {
+            'id': row['id'],
+            'created_at': _datetime.to_representation(row['created_at']),
+            'is_paid': row['is_paid'],
+            'subtotal': decimal(row['subtotal']),
+            'delivery_fee': decimal(row['delivery_fee']),
+            'total': decimal(row['total']),
+        }
+        for row in rows
+    ]
+    if not include_items:
+        return data
+
+    items = {order['id']: [] for order in data}
+    lines = OrderItem.objects.filter(order_id__in=list(items)).order_by('id').values_list(*ORDER_ITEM_COLUMNS)
+    for pk, order_id, product_id, product_name, quantity, unit_price in lines:
+        items[order_id].append({
+            'id': pk,
+            'product': product_id,
+            'product_name': product_name,
+            'quantity': quantity,
+            'unit_price': decimal(unit_price),
+            'line_total': None if unit_price is None else _line_total.to_representation(unit_price * quantity),
+        })
+    detailed = []
+    for row, order in zip(rows, data):
+        order.update(user=row['user_id'], items=items[order['id']])
+        detailed.append({name: order[name] for name in OrderSerializer.Meta.fields})
+    return detailed
+
+
+def decimal(value):
+    # The database returns DecimalField values quantized to their places
+    return None if value is None else str(value)
@@ -0,0 +1,168 @@
+"""
+Resized derivatives of product images.
+
+Product cards are a few hundred pixels wide, so serving the original upload
+wastes most of the bytes on listing pages. Whenever a product's image
+changes, the task worker writes a WebP and a JPEG copy at each of
+``PRODUCT_IMAGE_WIDTHS`` that is narrower than the original, next to it in
+storage (``products/shoe.jpeg`` -> ``products/shoe_320w.webp``).
+
+What was generated is recorded on ``Product.image_variants`` so pages can
+build ``srcset`` attributes without touching storage. Products without
+variants (not generated yet, or an unreadable upload) fall back to the
+original file. ``generate_product_images`` backfills existing products.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from . import page_cache
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_IMAGE_WIDTHS = getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (160, 320, 640, 1024))
+
+# Extension -> (Pillow format, save options), best first.
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(name, width, extension):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_{width}w.{extension}'
+
+
+def variant_url(image, width, extension):
+    return image.storage.url(variant_name(image.name, width, extension))
+
+
+def needs_sync(product):
+    """Whether ``product``'s image changed since its variants were generated."""
+    name = product.image.name if product.image else ''
+    return (product.image_variants or {}).get('source', '') != name
+
+
+def sync_variants(product):
+    """
+    Bring ``product``'s derivatives in line with its current image, if it
+    changed since they were generated, and store the new ``image_variants``.
+    """
+    if not needs_sync(product):
+        return
+    name = product.image.name if product.image else ''
+    current = product.image_variants or {}
+    if current.get('source'):
+        delete_variants(product.image.storage, current)
+    variants = generate_variants(product.image) if name else {}
+    # update() rather than save() so the post_save receivers don't run again;
+    # the image URLs in cached and revalidated responses change, though.
+    Product.objects.filter(pk=product.pk).update(image_variants=variants)
+    product.image_variants = variants
+    page_cache.bump_catalog_version()
+
+
+def generate_variants(image):
+    """Write the derivatives of ``image`` (a ``FieldFile``) and describe them."""
+    try:
+        with image.storage.open(image.name, 'rb') as file:
+            source = Image.open(file)
+            source = ImageOps.exif_transpose(source)
+            source.load()
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not read product image %s: %s", image.name, exc)
+        return {'source': image.name, 'width': None, 'widths': []}
+
+    if source.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparent images onto white
+        background = Image.new('RGB', source.size, 'white')
+        rgba = source.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        source = background
+
+    widths = [width for width in PRODUCT_IMAGE_WIDTHS if width < source.width]
+    for width in widths:
+        height = max(1, round(source.height * width / source.width))
+        resized = source.resize((width, height), Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            save_file(image.storage, variant_name(image.name, width, extension), buffer.getvalue())
+    return {'source': image.name, 'width': source.width, 'widths': widths}
+
+
+def delete_variants(storage, variants):
+    for width in variants.get('widths', []):
+        for extension in VARIANT_FORMATS:
+            storage.delete(variant_name(variants['source'], width, extension))
+
+
+def save_file(storage, name, content):
+    # Storages pick a fresh name when one is taken; derivative names are fixed.
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def current_variants(product):
+    """``product.image_variants`` if they were generated from its current image, else None."""
+    variants = product.image_variants or {}
+    if product.image and variants.get('source') == product.image.name:
+        return variants
+    return None
+
+
+def srcset(product, extension='jpeg'):
+    """
+    ``srcset`` candidates for ``product``'s image in ``extension``. The
+    original is added as the widest candidate of the JPEG (fallback) set.
+    """
+    variants = current_variants(product)
+    if not variants:
+        return ''
+    image = product.image
+    candidates = [f'{variant_url(image, width, extension)} {width}w' for width in variants['widths']]
+    if extension == 'jpeg' and variants['width']:
+        candidates.append(f"{image.url} {variants['width']}w")
+    return ', '.join(candidates)
+
+
+def describe_image(storage, name, variants):
+    """
+    The ``images`` entry of the product API for an image stored as ``name``
+    with ``image_variants`` ``variants``, or None without an image.
+    """
+    if not name:
+        return None
+    if (variants or {}).get('source') != name:
+        variants = {}
+    return {
+        'original': storage.url(name),
+        'width': variants.get('width'),
+        'variants': [
+            {
+                'width': width,
+                'webp': storage.url(variant_name(name, width, 'webp')),
+                'jpeg': storage.url(variant_name(name, width, 'jpeg')),
+            }
+            for width in variants.get('widths', [])
+        ],
+    }
+
+
+def thumbnail_url(product, width):
+    """URL of the smallest JPEG variant at least ``width`` pixels wide, else the original."""
+    if not product.image:
+        return ''
+    variants = current_variants(product)
+    if variants:
+        for variant_width in variants['widths']:
+            if variant_width >= width:
+                return variant_url(product.image, variant_width, 'jpeg')
+    return product.image.url
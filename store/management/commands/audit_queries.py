@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from store import query_audit
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the queries the store pages run and report table scans. "
+        "Fails when a filtered query scans a table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Email of a user to request the pages as; the API, cart and order pages need one.")
+        parser.add_argument('--all', action='store_true', help="Also list expected scans of unfiltered queries.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}.")
+
+        findings, explained = query_audit.audit(user)
+        unexpected = [finding for finding in findings if not finding.expected]
+        for finding in findings:
+            if finding.expected and not options['all']:
+                continue
+            label = 'expected' if finding.expected else 'SCAN'
+            self.stdout.write(f"[{label}] {finding.page}: {finding.detail}\n    {finding.sql}")
+
+        summary = f"Explained {explained} queries; {len(unexpected)} unindexed scan(s)."
+        if unexpected:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import related
+
+
+class Command(BaseCommand):
+    help = "Recompute the related products shown on each product page. Run periodically."
+
+    def handle(self, *args, **options):
+        count = related.compute_all()
+        self.stdout.write(self.style.SUCCESS(f"Computed related products for {count} product(s)."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from store import bulk
+from store.models import Order, Product
+
+EXPORTS = {
+    'products': (Product, bulk.PRODUCT_COLUMNS),
+    'orders': (Order, bulk.ORDER_COLUMNS),
+}
+
+
+class Command(BaseCommand):
+    help = "Export every product or order as CSV or NDJSON, streaming rows in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='file_format', choices=sorted(bulk.FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help="File to write to; standard output by default.")
+        parser.add_argument('--chunk-size', type=int, default=bulk.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        model, columns = EXPORTS[options['model']]
+        chunks = bulk.export(model.objects.all(), columns, options['file_format'], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported {options['model']} to {options['output']}."))
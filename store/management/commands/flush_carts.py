@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.cart import flush_dirty_carts
+
+
+class Command(BaseCommand):
+    help = "Write pending cart changes from the cache back to the database."
+
+    def handle(self, *args, **options):
+        flushed = flush_dirty_carts()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} cart(s)."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store import images
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate resized image variants for products that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants for every product.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image=None).only('id', 'image', 'image_variants')
+        count = 0
+        for product in products.iterator(chunk_size=100):
+            if options['force']:
+                product.image_variants = {}
+            elif images.current_variants(product) is not None:
+                continue
+            images.sync_variants(product)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Generated image variants for {count} product(s)."))
@@ -0,0 +1,42 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        "Create and update products from a CSV or NDJSON file, e.g. a supplier feed. "
+        "Rows with an id update that product; rows without one create a product."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV or NDJSON file; - for standard input.")
+        parser.add_argument('--format', dest='file_format', choices=sorted(bulk.FORMATS), help="Defaults to the file extension, else csv.")
+        parser.add_argument('--batch-size', type=int, default=bulk.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['file']
+        file_format = options['file_format']
+        if file_format is None:
+            extension = os.path.splitext(path)[1].lstrip('.').lower()
+            file_format = extension if extension in bulk.FORMATS else 'csv'
+
+        if path == '-':
+            result = bulk.import_products(bulk.read_rows(sys.stdin, file_format), options['batch_size'])
+        else:
+            try:
+                file = open(path, newline='', encoding='utf-8-sig')
+            except OSError as exc:
+                raise CommandError(f"Can't read {path}: {exc}")
+            with file:
+                result = bulk.import_products(bulk.read_rows(file, file_format), options['batch_size'])
+
+        for number, errors in result.errors:
+            self.stderr.write(f"Line {number}: {errors}")
+        summary = f"Created {result.created} and updated {result.updated} product(s); skipped {len(result.errors)} invalid row(s)."
+        if result.errors:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:44
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    line_total = ExpressionWrapper(
+        Coalesce(F('unit_price'), F('product__price')) * F('quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(line_total))
+        .values('total')
+    )
+    Order.objects.filter(total__isnull=True).update(
+        total=Coalesce(Subquery(totals), Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_orderitem_unit_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_order_snapshots(apps, schema_editor):
+    """
+    Snapshot line prices/names and fill subtotal, delivery_fee and total for
+    orders placed before checkout recorded them, BATCH_SIZE orders at a time.
+    """
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+
+    pending = Order.objects.filter(subtotal__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        orders = list(pending.filter(pk__gt=last_pk).select_related('delivery_service')[:BATCH_SIZE])
+        if not orders:
+            break
+        last_pk = orders[-1].pk
+
+        subtotals = defaultdict(Decimal)
+        items = list(OrderItem.objects.filter(order__in=orders).select_related('product'))
+        for item in items:
+            if item.unit_price is None:
+                item.unit_price = item.product.price
+            if not item.product_name:
+                item.product_name = item.product.name
+            subtotals[item.order_id] += item.unit_price * item.quantity
+        OrderItem.objects.bulk_update(items, ['unit_price', 'product_name'])
+
+        for order in orders:
+            order.subtotal = subtotals[order.pk]
+            order.delivery_fee = order.delivery_service.price if order.delivery_service else Decimal('0.00')
+            order.total = order.subtotal + order.delivery_fee
+        Order.objects.bulk_update(orders, ['subtotal', 'delivery_fee', 'total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_order_price_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_snapshots, migrations.RunPython.noop),
+    ]
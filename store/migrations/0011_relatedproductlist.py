@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_order_user_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductList',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='related_list', serialize=False, to='store.product')),
+                ('product_ids', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
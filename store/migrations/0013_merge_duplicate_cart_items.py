@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """
+    Fold cart lines for the same product into the oldest one, adding up the
+    quantities, so (cart, product) can be made unique.
+    """
+    CartItem = apps.get_model('store', 'CartItem')
+
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('pk'), keep=Min('pk'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for row in list(duplicates):
+        lines = CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id'])
+        lines.filter(pk=row['keep']).update(quantity=row['quantity'])
+        lines.exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -17,6 +21,40 @@ CATEGORY_CHOICES = [
     ('Books & Stationery', 'Books & Stationery'),
 ]
 
+class LineItemQuerySet(models.QuerySet):
+    """Price arithmetic for cart and order lines, done in SQL."""
+
+    def unit_price_expression(self):
+        return F('product__price')
+
+    def subtotal_expression(self):
+        return ExpressionWrapper(
+            self.unit_price_expression() * F('quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    def with_subtotals(self):
+        return self.annotate(subtotal=self.subtotal_expression())
+
+    def totals(self):
+        """Return ``total``, ``item_count`` (lines) and ``quantity`` (units) in one query."""
+        return self.aggregate(
+            total=Coalesce(
+                Sum(self.subtotal_expression()),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            item_count=Count('pk'),
+            quantity=Coalesce(Sum('quantity'), 0),
+        )
+
+
+class OrderItemQuerySet(LineItemQuerySet):
+    def unit_price_expression(self):
+        # Lines from before prices were snapshotted fall back to the current price
+        return Coalesce(F('unit_price'), F('product__price'))
+
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -24,12 +62,32 @@ class Product(models.Model):
     category = models.CharField(max_length=40, choices=CATEGORY_CHOICES, default='Home & Living')
     stock = models.PositiveIntegerField()
     image = models.FileField(upload_to='products/', blank=True, null=True)
+    # Resized copies of ``image``; maintained by store.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class RelatedProductList(models.Model):
+    """Precomputed related products for a product; see store/related.py."""
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name='related_list')
+    product_ids = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Related products for {self.product_id}"
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -52,6 +110,18 @@ class Order(models.Model):
     delivery_address = models.CharField(max_length=255, blank=True, null=True)
     delivery_postal_code = models.CharField(max_length=20, blank=True, null=True)
     delivery_country = models.CharField(max_length=100, blank=True, null=True)
+    # Filled at checkout so order history never has to re-price lines
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    delivery_fee = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # Admin order list: filtered by payment status and date
+            models.Index(fields=['is_paid', '-created_at'], name='order_paid_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user}"
@@ -61,9 +131,25 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Product name and price at the time of checkout
+    product_name = models.CharField(max_length=100, blank=True)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    objects = OrderItemQuerySet.as_manager()
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        if not self.product_name:
+            self.product_name = self.product.name
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
+        return f"{self.quantity} x {self.product_name or self.product.name}"
 
 
 class Cart(models.Model):
@@ -79,8 +165,18 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = LineItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cartitem_cart_product_unique'),
+        ]
+
     @property
     def total_price(self):
+        # Rows from CartItem.objects.with_subtotals() already carry it
+        if hasattr(self, 'subtotal'):
+            return self.subtotal
         return self.product.price * self.quantity
 
 
@@ -102,7 +198,8 @@ class PaymentMethod(models.Model):
 
 
 class DeliveryService(models.Model):
-    name = models.CharField(max_length=100)
+    # Checkout looks the service up by name
+    name = models.CharField(max_length=100, db_index=True)
     price = models.DecimalField(max_digits=7, decimal_places=2)
     estimated_delivery_time = models.CharField(max_length=100)  # e.g. "3-5 days"
     address = models.CharField(max_length=255, blank=True, null=True)
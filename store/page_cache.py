@@ -0,0 +1,190 @@
+"""
+Rendered-HTML caching for the catalog pages.
+
+Cache keys carry a catalog version number that is bumped whenever a product
+is saved or deleted (see signals), so an edit in the admin shows up on the
+next request and superseded entries simply age out.
+
+Pages are rendered with a placeholder in place of the CSRF token and the
+requesting user's token is substituted on the way out, which lets one cached
+copy of a page (or a ``{% cache %}`` fragment of it) serve every visitor.
+
+``arender_catalog_page`` is the same for async views.
+
+The version also makes the ETag of catalog pages and of the product list
+API, so a client revalidating an unchanged page gets a 304 before any
+product is read or any template rendered. Page ETags include the user and
+CSRF cookie (pages show both) and change at least every
+``CATALOG_PAGE_TIMEOUT``, since stock sold at checkout doesn't bump the
+version. The API also gets ``Last-Modified``, from when the version was
+last bumped.
+
+For ``REPLICA_PIN_SECONDS`` after a bump, pages and the API read from the
+primary: the replica may not have the change yet, and what is rendered then
+is cached and ETagged under the new version.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from core import routers
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_MODIFIED_KEY = 'catalog:modified'
+CATALOG_PAGE_TIMEOUT = getattr(settings, 'CATALOG_PAGE_TIMEOUT', 60 * 10)
+CSRF_PLACEHOLDER = 'csrf0token0placeholder'
+
+# Cache-Control of catalog pages and of the product list API. Pages show
+# the user, so they are private and revalidated on every view; API clients
+# may reuse a response for a minute.
+CATALOG_PAGE_CACHE_CONTROL = getattr(settings, 'CATALOG_PAGE_CACHE_CONTROL', {'private': True, 'no_cache': True})
+CATALOG_API_CACHE_CONTROL = getattr(settings, 'CATALOG_API_CACHE_CONTROL', {'private': True, 'max_age': 60})
+
+
+def catalog_version():
+    # Seeded from the clock so versions aren't reused if the cache is cleared
+    return cache.get_or_set(CATALOG_VERSION_KEY, lambda: int(time.time()), None)
+
+
+async def acatalog_version():
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, lambda: int(time.time()), None)
+
+
+def bump_catalog_version():
+    # Modified first, so whoever sees the new version sees it too
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), None)
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, int(time.time()), None)
+
+
+def catalog_modified():
+    """When the catalog version was last bumped (or first read)."""
+    timestamp = cache.get_or_set(CATALOG_MODIFIED_KEY, time.time, None)
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def read_fresh_catalog(modified):
+    """Pin this request to the primary if the catalog changed at ``modified`` (a timestamp) or just before."""
+    if modified is not None and time.time() - modified < routers.REPLICA_PIN_SECONDS:
+        routers.pin_to_primary()
+
+
+def catalog_etag(version, *variants):
+    value = ':'.join(str(part) for part in (version, *variants))
+    return '"%s"' % hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()
+
+
+def page_etag(request, version, user):
+    period = int(time.time() // CATALOG_PAGE_TIMEOUT)
+    # get_token() picks the CSRF secret the page will embed, setting the
+    # cookie on a first visit so the next one can already match.
+    get_token(request)
+    return catalog_etag(version, period, user.pk or '', request.META['CSRF_COOKIE'])
+
+
+# ``condition()`` callbacks for the product list API; the JSON and the
+# browsable API differ, so Accept is part of the ETag.
+
+def api_etag(request, *args, **kwargs):
+    version = catalog_version()
+    read_fresh_catalog(cache.get(CATALOG_MODIFIED_KEY))
+    return catalog_etag(version, request.META.get('HTTP_ACCEPT', ''))
+
+
+def api_last_modified(request, *args, **kwargs):
+    return catalog_modified()
+
+
+def page_cache_key(request, version):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode(), usedforsecurity=False).hexdigest()
+    return f'catalog:page:{version}:{digest}'
+
+
+def render_catalog_page(request, template_name, get_context, shared=False):
+    """
+    Render ``template_name`` with the context returned by ``get_context``,
+    which is only called on a cache miss.
+
+    Pages are cached whole for anonymous visitors, keyed by path and query
+    string. ``shared`` pages contain nothing user-specific and are cached for
+    everyone. Other pages rely on ``{% cache %}`` fragments keyed by the
+    ``catalog_version`` context variable.
+    """
+    version = catalog_version()
+    read_fresh_catalog(cache.get(CATALOG_MODIFIED_KEY))
+    etag = page_etag(request, version, request.user)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return conditional_response(not_modified, etag)
+
+    key = None
+    if shared or not request.user.is_authenticated:
+        key = page_cache_key(request, version)
+
+    content = cache.get(key) if key else None
+    if content is None:
+        context = page_context(get_context(), version)
+        content = render_to_string(template_name, context, request)
+        if key:
+            cache.set(key, content, CATALOG_PAGE_TIMEOUT)
+
+    return conditional_response(page_response(request, content), etag)
+
+
+async def arender_catalog_page(request, template_name, get_context, shared=False):
+    """
+    ``render_catalog_page`` for async views; ``get_context`` is a coroutine
+    function. Templates are rendered in a worker thread since querysets in
+    the context may still be evaluated there.
+    """
+    version = await acatalog_version()
+    read_fresh_catalog(await cache.aget(CATALOG_MODIFIED_KEY))
+    user = await request.auser()
+    etag = page_etag(request, version, user)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return conditional_response(not_modified, etag)
+
+    key = None
+    if shared or not user.is_authenticated:
+        key = page_cache_key(request, version)
+
+    content = await cache.aget(key) if key else None
+    if content is None:
+        context = page_context(await get_context(), version)
+        content = await sync_to_async(render_to_string)(template_name, context, request)
+        if key:
+            await cache.aset(key, content, CATALOG_PAGE_TIMEOUT)
+
+    return conditional_response(page_response(request, content), etag)
+
+
+def page_context(context, version):
+    context.update({
+        'catalog_version': version,
+        'catalog_cache_timeout': CATALOG_PAGE_TIMEOUT,
+        'csrf_token': CSRF_PLACEHOLDER,
+    })
+    return context
+
+
+def page_response(request, content):
+    return HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def conditional_response(response, etag):
+    response.headers['ETag'] = etag
+    patch_cache_control(response, **CATALOG_PAGE_CACHE_CONTROL)
+    return response
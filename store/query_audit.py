@@ -0,0 +1,175 @@
+"""
+EXPLAIN the queries the store pages run and flag the ones that scan a table.
+
+``audit()`` requests each page with the test client, records every SELECT,
+UPDATE and DELETE it sends to the database (plus the lookups of ``lookups()``,
+which POST handlers and the admin make), and asks the database for its
+plan: ``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN (FORMAT JSON)`` on
+PostgreSQL. A query is flagged when the plan reads a whole table instead of
+searching an index. Scans of queries without a WHERE clause (listing every
+payment method, say) are reported as expected: there is nothing to index.
+
+Requests run inside a transaction that is rolled back, against a private
+in-memory cache so cached pages don't hide their queries. ``user``'s session
+is created directly rather than by logging in, so no login event is logged.
+
+PostgreSQL prefers sequential scans on small tables even when an index
+exists, so audit a database with realistic row counts there.
+"""
+import re
+from contextlib import ExitStack
+from dataclasses import dataclass
+from importlib import import_module
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .models import CATEGORY_CHOICES, CartItem, DeliveryService, Order, PaymentMethod, Product
+
+AUDIT_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'query-audit',
+    },
+}
+
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+@dataclass
+class Finding:
+    page: str
+    table: str
+    sql: str
+    detail: str
+    expected: bool
+
+
+def pages(user=None):
+    """(name, path) of the pages to audit; the ones needing a user only with one."""
+    product = Product.objects.order_by('pk').first()
+    category = CATEGORY_CHOICES[0][0]
+    urls = [
+        ('home', reverse('homepage')),
+        ('home search', with_query(reverse('homepage'), search='a')),
+        ('home category', with_query(reverse('homepage'), category=category)),
+        ('category', reverse('category', args=[category])),
+        ('product list', reverse('product-list-create')),
+        ('product list filtered', with_query(reverse('product-list-create'), category=category, min_price=10)),
+        ('product suggest', with_query(reverse('product-suggest'), q='a')),
+        ('payment methods', reverse('payment-method-list-create')),
+    ]
+    if product is not None:
+        urls.append(('product detail', reverse('product_detail', args=[product.pk])))
+    if user is not None:
+        urls += [
+            ('cart', reverse('cart-detail')),
+            ('checkout', reverse('checkout')),
+            ('orders', reverse('order-list-create')),
+            ('unpaid orders', with_query(reverse('order-list-create'), is_paid='false', include='items')),
+        ]
+    return urls
+
+
+def lookups():
+    """(name, queryset) for lookups made outside GET requests."""
+    return [
+        ('checkout payment method', PaymentMethod.objects.filter(name='cod')),
+        ('checkout delivery service', DeliveryService.objects.filter(name='Express')),
+        ('cart line', CartItem.objects.filter(cart_id=1, product_id=1)),
+        ('admin unpaid orders', Order.objects.filter(is_paid=False).order_by('-created_at')),
+        ('admin recent orders', Order.objects.filter(created_at__year=2024).order_by('-created_at')),
+    ]
+
+
+def with_query(path, **params):
+    return f'{path}?{urlencode(params)}'
+
+
+def audit(user=None, urls=None):
+    """
+    Request ``urls`` (default: ``pages(user)``) and return a ``Finding`` per
+    table scan in their queries' plans, plus the number of queries explained.
+    """
+    if urls is None:
+        urls = pages(user)
+    client = Client()
+
+    findings, explained = [], 0
+    with override_settings(CACHES=AUDIT_CACHES, ALLOWED_HOSTS=['*']), transaction.atomic():
+        cache.clear()
+        if user is not None:
+            start_session(client, user)
+        for page, url in urls:
+            statements = capture(client, url)
+            for alias, sql, params in statements:
+                for table, detail in table_scans(connections[alias], sql, params):
+                    findings.append(Finding(page, table, sql, detail, expected=' WHERE ' not in sql))
+            explained += len(statements)
+        for name, queryset in lookups():
+            sql, params = queryset.query.sql_with_params()
+            for table, detail in table_scans(connections[queryset.db], sql, params):
+                findings.append(Finding(name, table, sql, detail, expected=False))
+            explained += 1
+        transaction.set_rollback(True)
+    return findings, explained
+
+
+def start_session(client, user):
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+def capture(client, url):
+    """Request ``url`` and return the (alias, sql, params) it should explain."""
+    statements = []
+
+    def record(alias):
+        def wrapper(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                statements.append((alias, sql, params))
+            return execute(sql, params, many, context)
+        return wrapper
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record(connection.alias)))
+        client.get(url)
+    return statements
+
+
+def table_scans(connection, sql, params):
+    """(table, plan detail) for each full table scan in the plan of ``sql``."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            return [
+                (node['Relation Name'], f"Seq Scan on {node['Relation Name']}")
+                for node in plan_nodes(plan[0]['Plan'])
+                if node['Node Type'] == 'Seq Scan'
+            ]
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        scans = []
+        for *_, detail in cursor.fetchall():
+            match = SQLITE_SCAN.match(detail)
+            if match:
+                scans.append((match.group(1), detail))
+        return scans
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
@@ -0,0 +1,155 @@
+"""
+Precomputed "related products" for the product detail page.
+
+Each product's neighbour list is ranked by how often the two products were
+bought together, then topped up with the newest products from the same
+category. Lists are stored as product ids in ``RelatedProductList`` (and
+cached), so the detail page fetches its neighbours with one primary key
+lookup. ``compute_related_products`` rebuilds every list and is meant to run
+periodically (e.g. nightly from cron); a product without a list gets one
+computed on first view.
+"""
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from . import page_cache
+from .models import OrderItem, Product, RelatedProductList
+
+RELATED_LIMIT = 4
+RELATED_CACHE_TIMEOUT = 60 * 60 * 24
+BATCH_SIZE = 1000
+
+
+def cache_key(product_id):
+    return f'related:{product_id}'
+
+
+def related_products(product):
+    """Return the related products for ``product``, best first."""
+    product_ids = related_product_ids(product)
+    products = Product.objects.in_bulk(product_ids)
+    # Ids of products deleted since the list was computed are skipped.
+    return [products[pk] for pk in product_ids if pk in products]
+
+
+def related_product_ids(product):
+    key = cache_key(product.pk)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = (
+            RelatedProductList.objects.filter(product_id=product.pk)
+            .values_list('product_ids', flat=True)
+            .first()
+        )
+        if product_ids is None:
+            product_ids = compute_for_product(product)
+        cache.set(key, product_ids, RELATED_CACHE_TIMEOUT)
+    return product_ids
+
+
+async def arelated_products(product):
+    """``related_products`` for async views."""
+    product_ids = await arelated_product_ids(product)
+    products = await Product.objects.ain_bulk(product_ids)
+    return [products[pk] for pk in product_ids if pk in products]
+
+
+async def arelated_product_ids(product):
+    key = cache_key(product.pk)
+    product_ids = await cache.aget(key)
+    if product_ids is None:
+        product_ids = await (
+            RelatedProductList.objects.filter(product_id=product.pk)
+            .values_list('product_ids', flat=True)
+            .afirst()
+        )
+        if product_ids is None:
+            product_ids = await sync_to_async(compute_for_product)(product)
+        await cache.aset(key, product_ids, RELATED_CACHE_TIMEOUT)
+    return product_ids
+
+
+def compute_for_product(product):
+    """Compute and store the list for a single product."""
+    co_purchases = co_purchase_counts(OrderItem.objects.filter(product_id=product.pk))
+    same_category = list(
+        Product.objects.filter(category=product.category)
+        .exclude(pk=product.pk)
+        .order_by('-created_at', '-id')
+        .values_list('pk', flat=True)[:RELATED_LIMIT]
+    )
+    product_ids = rank(product.pk, co_purchases.get(product.pk, {}), same_category)
+    RelatedProductList.objects.update_or_create(product_id=product.pk, defaults={'product_ids': product_ids})
+    return product_ids
+
+
+def compute_all():
+    """Recompute and store the list for every product. Returns the count."""
+    co_purchases = co_purchase_counts(OrderItem.objects.all())
+
+    by_category = defaultdict(list)
+    products = Product.objects.order_by('-created_at', '-id').values_list('pk', 'category')
+    for pk, category in products.iterator(chunk_size=BATCH_SIZE):
+        by_category[category].append(pk)
+
+    rows = []
+    for category, product_ids in by_category.items():
+        newest = product_ids[:RELATED_LIMIT + 1]
+        for pk in product_ids:
+            same_category = [other for other in newest if other != pk][:RELATED_LIMIT]
+            rows.append(RelatedProductList(
+                product_id=pk,
+                product_ids=rank(pk, co_purchases.get(pk, {}), same_category),
+            ))
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        RelatedProductList.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['product_ids', 'computed_at'],
+        )
+        cache.delete_many([cache_key(row.product_id) for row in batch])
+    # Detail pages embed the lists
+    page_cache.bump_catalog_version()
+    return len(rows)
+
+
+def co_purchase_counts(order_items):
+    """
+    Map product id -> {other product id: number of orders containing both}
+    for the products of ``order_items``.
+    """
+    pairs = (
+        order_items
+        .annotate(other_id=F('order__items__product_id'))
+        .exclude(other_id=F('product_id'))
+        .values('product_id', 'other_id')
+        .annotate(orders=Count('order_id', distinct=True))
+    )
+    counts = defaultdict(dict)
+    for row in pairs.iterator(chunk_size=BATCH_SIZE):
+        counts[row['product_id']][row['other_id']] = row['orders']
+    return counts
+
+
+def rank(product_id, co_purchases, same_category):
+    """Most co-purchased first, then same-category products, without repeats."""
+    ranked = sorted(co_purchases, key=lambda other: (-co_purchases[other], -other))
+    for other in same_category:
+        if other not in ranked:
+            ranked.append(other)
+    return [other for other in ranked if other != product_id][:RELATED_LIMIT]
+
+
+def invalidate(product_id):
+    RelatedProductList.objects.filter(product_id=product_id).delete()
+    clear_cache(product_id)
+
+
+def clear_cache(product_id):
+    cache.delete(cache_key(product_id))
@@ -0,0 +1,184 @@
+"""
+Full-text search over the product catalog.
+
+Products are kept in a database-native inverted index: an FTS5 virtual table
+on SQLite and a GIN-indexed ``tsvector`` expression on PostgreSQL. Any other
+database falls back to ``icontains`` lookups. The backend is picked from the
+vendor of the connection the query runs on.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Case, IntegerField, Q, When
+
+from .models import Product
+
+SEARCH_RESULT_LIMIT = 100
+SUGGEST_LIMIT = 8
+
+FTS_TABLE = 'store_product_fts'
+GIN_INDEX = 'store_product_search_gin'
+
+# Name matches rank above category matches, which rank above description matches.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple'::regconfig, name), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, category), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, description), 'C')"
+)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return _TERM_RE.findall((query or '').lower())
+
+
+class BaseSearchBackend:
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, terms, limit, queryset=None):
+        """
+        Return ids of products matching every term (as a prefix), best first.
+        Only products in ``queryset`` are considered, before ``limit`` applies.
+        """
+        raise NotImplementedError
+
+    def restrict(self, queryset, column):
+        """An ``AND column IN (...)`` clause and its params for ``queryset``'s filters, if any."""
+        if queryset is None or not queryset.query.has_filters():
+            return '', []
+        sql, params = queryset.order_by().values('pk').query.get_compiler(using=self.using).as_sql()
+        return f' AND {column} IN ({sql})', list(params)
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    def search(self, terms, limit, queryset=None):
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term)
+                | Q(category__icontains=term)
+                | Q(description__icontains=term)
+            )
+        if queryset is None:
+            queryset = Product.objects.all()
+        queryset = queryset.using(self.using).filter(condition)
+        return list(queryset.order_by('-created_at').values_list('pk', flat=True)[:limit])
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    def index(self, products):
+        rows = [(p.pk, p.name, p.description, p.category) for p in products]
+        if not rows:
+            return
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, name, description, category) "
+                "VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, product_ids):
+        product_ids = [(pk,) for pk in product_ids]
+        if not product_ids:
+            return
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", product_ids)
+
+    def rebuild(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, description, category) "
+                f"SELECT id, name, description, category FROM {Product._meta.db_table}"
+            )
+
+    def search(self, terms, limit, queryset=None):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        restriction, params = self.restrict(queryset, 'rowid')
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s{restriction} "
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0, 4.0) LIMIT %s",
+                [match, *params, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    # The GIN expression index is maintained by PostgreSQL itself, so
+    # index/remove/rebuild have nothing to do.
+
+    def search(self, terms, limit, queryset=None):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        restriction, params = self.restrict(queryset, 'id')
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {Product._meta.db_table} "
+                f"WHERE ({PG_SEARCH_VECTOR}) @@ to_tsquery('simple'::regconfig, %s){restriction} "
+                f"ORDER BY ts_rank(({PG_SEARCH_VECTOR}), to_tsquery('simple'::regconfig, %s)) DESC, id "
+                f"LIMIT %s",
+                [tsquery, *params, tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(using=None):
+    using = using or router.db_for_write(Product)
+    backend_class = BACKENDS.get(connections[using].vendor, BasicSearchBackend)
+    return backend_class(using)
+
+
+def search_products(query, queryset=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Filter ``queryset`` down to products matching ``query`` and order them by
+    relevance. Every word in the query must match the start of a word in the
+    product's name, category or description. ``limit`` caps the matches
+    within ``queryset``, so filter it before searching rather than after.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+
+    ids = get_backend(queryset.db).search(terms, limit, queryset)
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(ranking)
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    return list(search_products(query, limit=limit).values('id', 'name'))
+
+
+def index_products(products, using=None):
+    get_backend(using).index(products)
+
+
+def remove_products(product_ids, using=None):
+    get_backend(using).remove(product_ids)
+
+
+def rebuild_index(using=None):
+    get_backend(using).rebuild()
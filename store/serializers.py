@@ -1,28 +1,108 @@
 from rest_framework import serializers
+from .images import describe_image
 from .models import Product, Order, OrderItem
 
 
 class ProductSerializer(serializers.ModelSerializer):
     category_display = serializers.CharField(source='get_category_display', read_only=True)
+    images = serializers.SerializerMethodField()
+
+    # Model columns read by serializer fields that aren't plain model fields.
+    field_columns = {'category_display': ['category'], 'images': ['image', 'image_variants']}
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'category', 'category_display']
+        fields = ['id', 'name', 'description', 'price', 'category', 'category_display', 'images']
+
+    def __init__(self, *args, **kwargs):
+        # Optional subset of Meta.fields to render, e.g. from ?fields=id,name
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def columns_for(cls, fields):
+        return {column for name in fields for column in cls.field_columns.get(name, [name])}
+
+    def get_images(self, product):
+        if not product.image:
+            return None
+        return describe_image(product.image.storage, product.image.name, product.image_variants)
+
+
+class ProductImportSerializer(ProductSerializer):
+    """A row of a bulk product import (see store/bulk.py); ``id`` names a product to update."""
+    id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ['id', 'name', 'description', 'price', 'category', 'stock']
+
+
+class ProductBatchSerializer(serializers.ListSerializer):
+    """
+    Products to create (items without ``id``) and partial updates (``id`` and
+    the fields to change). Errors are reported per item, in request order.
+    After validation ``existing`` holds the ids of the products being updated.
+    """
+    max_items = 1000
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('child', ProductImportSerializer())
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', self.max_items)
+        super().__init__(*args, **kwargs)
+        # Unbound, so it is its own root and ``partial`` applies to it alone
+        self.update_child = ProductImportSerializer(partial=True)
+        self.existing = set()
+
+    def run_child_validation(self, data):
+        if isinstance(data, dict) and data.get('id') is not None:
+            return self.update_child.run_validation(data)
+        return super().run_child_validation(data)
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ids = [item['id'] for item in items if item.get('id') is not None]
+        self.existing = set(Product.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+        errors, seen = [], set()
+        for item in items:
+            pk = item.get('id')
+            if pk is not None and pk not in self.existing:
+                errors.append({'id': [f"No product with id {pk}."]})
+            elif pk is not None and pk in seen:
+                errors.append({'id': [f"Product {pk} is updated more than once."]})
+            else:
+                errors.append({})
+            seen.add(pk)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    # Rendered from the checkout-time snapshot columns, never from Product
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity']
+        fields = ['id', 'product', 'product_name', 'quantity', 'unit_price', 'line_total']
+        read_only_fields = fields
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'created_at', 'is_paid', 'subtotal', 'delivery_fee', 'total']
+        read_only_fields = fields
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'created_at', 'is_paid', 'items']
+        fields = ['id', 'user', 'created_at', 'is_paid', 'subtotal', 'delivery_fee', 'total', 'items']
+        read_only_fields = ['subtotal', 'delivery_fee', 'total']
 
 
 from rest_framework import serializers
@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import facets, images, page_cache, related, search, tasks
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, using, **kwargs):
+    search.index_products([instance], using=using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, using, **kwargs):
+    search.remove_products([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_related_on_save(sender, instance, created, **kwargs):
+    # A new product has no list yet; a changed one (e.g. new category) gets
+    # its list recomputed on the next detail page view.
+    if not created:
+        related.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_related_on_delete(sender, instance, **kwargs):
+    # The stored list goes with the product (on_delete=CASCADE)
+    related.clear_cache(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_catalog_version(sender, **kwargs):
+    # Stock changes made with queryset.update() (checkout) don't fire this;
+    # cached pages show them once they expire.
+    page_cache.bump_catalog_version()
+
+
+@receiver(pre_save, sender=Product)
+def remember_facet_row(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._facet_row = facets.stored_row(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def adjust_facets_on_save(sender, instance, created, **kwargs):
+    if created:
+        facets.adjust(None, facets.product_row(instance))
+    elif getattr(instance, '_facet_row', None) is not None:
+        facets.adjust(instance._facet_row, facets.product_row(instance))
+
+
+@receiver(post_delete, sender=Product)
+def adjust_facets_on_delete(sender, instance, **kwargs):
+    facets.adjust(facets.product_row(instance), None)
+
+
+@receiver(post_save, sender=Product)
+def sync_image_variants(sender, instance, raw, **kwargs):
+    if not raw and images.needs_sync(instance):
+        tasks.sync_image_variants.delay(instance.pk)
@@ -0,0 +1,11 @@
+from taskqueue.registry import task
+
+from . import images
+from .models import Product
+
+
+@task(queue='media')
+def sync_image_variants(product_id):
+    product = Product.objects.filter(pk=product_id).only('id', 'image', 'image_variants').first()
+    if product is not None:
+        images.sync_variants(product)
@@ -0,0 +1,36 @@
+from django import template
+from django.utils.html import format_html
+
+from store import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_picture(product, sizes='100vw', css_class='', lazy=True):
+    """
+    Render ``product``'s image as a ``<picture>`` offering the WebP variants
+    with the JPEG variants (and the original) as fallback.
+    """
+    if not product.image:
+        return ''
+    loading = 'lazy' if lazy else 'eager'
+    variants = images.current_variants(product)
+    if not variants or not variants['widths']:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}">',
+            product.image.url, product.name, css_class, loading,
+        )
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}">'
+        '</picture>',
+        images.srcset(product, 'webp'), sizes,
+        product.image.url, images.srcset(product), sizes, product.name, css_class, loading,
+    )
+
+
+@register.simple_tag
+def product_thumbnail_url(product, width):
+    return images.thumbnail_url(product, width)
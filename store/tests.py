@@ -1,3 +1,949 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.renderers import JSONRenderer
+
+from core import routers
+from core.renderers import ORJSONRenderer
+from core.testing import QueryBudgetMixin
+from taskqueue.worker import run_pending
+from user.models import User
+
+from . import bulk, facets, fast_serializers, images, page_cache, query_audit, related, search
+from .cart import CachedCart, dirty_carts, flush_dirty_carts, upsert_lines
+from .models import CartItem, Order, OrderItem, PaymentMethod, Product, RelatedProductList
+from .serializers import OrderSerializer, OrderSummarySerializer, ProductBatchSerializer, ProductSerializer
+
+LINES = 20
+
+
+class StoreTestCase(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='shopper@example.com', password='secret-pass-123')
+        cls.products = [
+            Product.objects.create(
+                name=f'Product {i}',
+                description=f'Description {i}',
+                price=Decimal(i + 1),
+                category='Electronics' if i % 2 else 'Gaming',
+                stock=100,
+                image=f'products/product_{i}.jpeg',
+                # The files don't exist; don't try to resize them
+                image_variants={'source': f'products/product_{i}.jpeg', 'width': None, 'widths': []},
+            )
+            for i in range(LINES)
+        ]
+        cls.payment_method = PaymentMethod.objects.create(name='cod')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def fill_cart(self):
+        cart = CachedCart.for_user(self.user)
+        for product in self.products:
+            cart.add(product.pk, 2)
+        cart.flush()
+        cart.invalidate()
+
+    def place_orders(self, count=5):
+        for _ in range(count):
+            order = Order.objects.create(user=self.user, payment_method=self.payment_method)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, product_name=product.name, quantity=1, unit_price=product.price)
+                for product in self.products
+            ])
+
+
+class CatalogQueryBudgetTests(StoreTestCase):
+    def test_home(self):
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse('homepage'))
+        self.assertEqual(len(response.context['products']), LINES)
+
+    def test_home_anonymous(self):
+        self.client.logout()
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('homepage'))
+
+    def test_home_search(self):
+        # Searched within the category, and across all of them for the facets
+        with self.assertMaxQueries(6):
+            response = self.client.get(reverse('homepage'), {'search': 'prod', 'category': 'Gaming'})
+        self.assertEqual(len(response.context['products']), LINES // 2)
+
+    def test_category(self):
+        facets.summary()
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('category', args=['Gaming']))
+        self.assertEqual(len(response.context['products']), LINES // 2)
+
+    def test_product_detail(self):
+        related.compute_all()
+        with self.assertMaxQueries(5):
+            response = self.client.get(reverse('product_detail', args=[self.products[0].pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list_api(self):
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('product-list-create'), {'page_size': LINES})
+        self.assertEqual(len(response.json()['results']), LINES)
+
+    def test_product_suggest(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('product-suggest'), {'q': 'prod'})
+        self.assertEqual(len(response.json()['results']), 8)
+
+
+class AsyncCatalogViewTests(StoreTestCase):
+    # The async client runs views on the event loop, where a blocking ORM or
+    # cache call raises SynchronousOnlyOperation.
+
+    async def test_home(self):
+        response = await self.async_client.get(reverse('homepage'), {'search': 'prod', 'category': 'Gaming'})
+        self.assertEqual(len(response.context['products']), LINES // 2)
+
+    async def test_category(self):
+        response = await self.async_client.get(reverse('category', args=['Gaming']))
+        self.assertEqual(len(response.context['products']), LINES // 2)
+
+    async def test_product_detail(self):
+        url = reverse('product_detail', args=[self.products[0].pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.context['product'], self.products[0])
+        self.assertEqual(len(response.context['related_products']), related.RELATED_LIMIT)
+        response = await self.async_client.get(reverse('product_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_product_detail_accepts_jwt(self):
+        url = reverse('product_detail', args=[self.products[0].pk])
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        response = await self.async_client.get(url, headers={'authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['product'], self.products[0])
+
+        response = await self.async_client.get(url, headers={'authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 302)
+
+
+class CatalogPageCacheTests(StoreTestCase):
+    def test_anonymous_home_is_cached(self):
+        self.client.logout()
+        self.client.get(reverse('homepage'), {'category': 'Gaming'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('homepage'), {'category': 'Gaming'})
+        self.assertContains(response, 'Product 0')
+        self.assertNotContains(response, page_cache.CSRF_PLACEHOLDER)
+
+    def test_product_grid_fragment_is_cached(self):
+        self.client.get(reverse('homepage'))
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('homepage'))
+        self.assertContains(response, 'Product 19')
+        self.assertNotContains(response, page_cache.CSRF_PLACEHOLDER)
+
+    def test_product_edit_invalidates_pages(self):
+        product = self.products[0]
+        url = reverse('product_detail', args=[product.pk])
+        self.assertContains(self.client.get(url), '$1.00')
+        with self.assertMaxQueries(2):
+            self.client.get(url)
+
+        product.price = Decimal('7.25')
+        product.save()
+        self.assertContains(self.client.get(url), '$7.25')
+
+
+class ConditionalRequestTests(StoreTestCase):
+    def assertNotModified(self, url, **headers):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in context.captured_queries if 'store_product' in query['sql']])
+        return response
+
+    def test_product_list(self):
+        url = reverse('product-list-create')
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+        self.assertIn('Last-Modified', response)
+
+        self.assertNotModified(url, if_none_match=response['ETag'])
+        self.assertNotModified(url, if_modified_since=response['Last-Modified'])
+        response = self.client.get(url, headers={'if_none_match': response['ETag'], 'accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list_changes_with_catalog(self):
+        url = reverse('product-list-create')
+        etag = self.client.get(url)['ETag']
+        self.products[0].save()
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pages(self):
+        for url in (reverse('homepage'), reverse('category', args=['Gaming']), reverse('product_detail', args=[self.products[0].pk])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertIn('private', response['Cache-Control'])
+            self.assertEqual(self.assertNotModified(url, if_none_match=response['ETag'])['ETag'], response['ETag'])
+
+    def test_page_etag_varies_by_user(self):
+        url = reverse('homepage')
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        with mock.patch('store.page_cache.time.time', return_value=time.time() + page_cache.CATALOG_PAGE_TIMEOUT):
+            # Stock changes at checkout don't bump the version
+            response = self.client.get(url, headers={'if_none_match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+
+
+class CartQueryBudgetTests(StoreTestCase):
+    def test_cart_cold_cache(self):
+        self.fill_cart()
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('cart-detail'))
+        self.assertEqual(len(response.context['cart_items']), LINES)
+
+    def test_cart_warm_cache(self):
+        self.fill_cart()
+        self.client.get(reverse('cart-detail'))
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('cart-detail'))
+
+    def test_add_to_cart(self):
+        with self.assertMaxQueries(4):
+            response = self.client.post(reverse('add_to_cart', args=[self.products[0].pk]), {'quantity': 1})
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_cart_item(self):
+        self.fill_cart()
+        item = CartItem.objects.get(product=self.products[0])
+        with self.assertMaxQueries(4):
+            response = self.client.post(reverse('update_cart_item', args=[item.pk]), {'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+
+    def test_remove_from_cart(self):
+        self.fill_cart()
+        item = CartItem.objects.get(product=self.products[0])
+        with self.assertMaxQueries(4):
+            response = self.client.post(reverse('remove_from_cart', args=[item.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_checkout_page(self):
+        self.fill_cart()
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('checkout'))
+        self.assertEqual(len(response.context['cart_items']), LINES)
+
+    def test_checkout(self):
+        self.fill_cart()
+        with self.assertMaxQueries(13):
+            response = self.client.post(reverse('checkout'), {
+                'payment_method': 'cod',
+                'delivery_address': '1 Market Road',
+                'delivery_postal_code': '100001',
+                'delivery_country': 'Nigeria',
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.count(), LINES)
+        order = Order.objects.get()
+        self.assertEqual(order.total, sum(product.price * 2 for product in self.products))
+        self.assertEqual(order.items.totals()['total'], order.total)
+
+
+class CartWriteBackTests(StoreTestCase):
+    def quantities(self):
+        return dict(CartItem.objects.values_list('product_id', 'quantity'))
+
+    def test_flush_is_one_statement(self):
+        self.fill_cart()
+        cart = CachedCart.for_user(self.user)
+        for product in self.products[1:5]:
+            cart.add(product.pk)
+        cart.set_quantity(self.products[0].pk, 7)
+        with self.assertNumQueries(4):  # savepoint, two upserts, release
+            cart.flush()
+        quantities = self.quantities()
+        self.assertEqual(quantities[self.products[0].pk], 7)
+        self.assertEqual(quantities[self.products[1].pk], 3)
+
+    def test_additions_add_up_without_the_lock(self):
+        self.fill_cart()
+        product_id, pending_id = self.products[0].pk, self.products[1].pk
+        cart = CachedCart.for_user(self.user)
+        cart.add(pending_id)  # the lock holder's, not flushed yet
+        cache.add(f'{cart.key}:lock', 1)  # held by another request
+        with mock.patch('store.cart.LOCK_WAIT', 0):
+            cart.add(product_id)
+            cart.add(product_id)
+        # Only this request's own change was written
+        self.assertEqual(self.quantities()[product_id], 4)
+        self.assertEqual(self.quantities()[pending_id], 2)
+
+        cache.delete(f'{cart.key}:lock')
+        self.assertEqual(cart.line(product_id).quantity, 4)
+        self.assertEqual(cart.line(pending_id).quantity, 3)
+        self.assertEqual(self.quantities()[pending_id], 3)
+        cart.flush()
+        self.assertEqual(self.quantities()[pending_id], 3)
+
+    def test_dirty_carts_registered_in_parallel(self):
+        threads = [threading.Thread(target=dirty_carts.add, args=[user_id]) for user_id in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(dirty_carts.members(), set(range(50)))
+
+    def test_cart_dirtied_during_flush_stays_registered(self):
+        other = User.objects.create_user(email='other@example.com', password='secret-pass-123')
+        CachedCart.for_user(self.user).add(self.products[0].pk)
+        flush = CachedCart.flush
+
+        def flush_and_add_elsewhere(cart):
+            flush(cart)
+            if cart.user_id == self.user.pk:
+                CachedCart.for_user(other).add(self.products[1].pk)
+
+        with mock.patch.object(CachedCart, 'flush', flush_and_add_elsewhere):
+            self.assertEqual(flush_dirty_carts(), 1)
+        self.assertEqual(dirty_carts.members(), {other.pk})
+        self.assertEqual(flush_dirty_carts(), 1)
+        self.assertEqual(dirty_carts.members(), set())
+
+    def test_due_changes_are_saved_on_read(self):
+        cart = CachedCart.for_user(self.user)
+        cart.add(self.products[0].pk)
+        self.assertEqual(self.quantities(), {})
+        with mock.patch('store.cart.CART_FLUSH_INTERVAL', 0):
+            self.assertEqual(len(cart), 1)
+        self.assertEqual(self.quantities(), {self.products[0].pk: 1})
+
+    def test_cart_flush_skipped_while_locked_stays_registered(self):
+        cart = CachedCart.for_user(self.user)
+        cart.add(self.products[0].pk)
+        cache.add(f'{cart.key}:lock', 1)  # held by a stuck request
+        with mock.patch('store.cart.LOCK_TIMEOUT', 0):
+            flush_dirty_carts()
+        self.assertEqual(self.quantities(), {})
+        self.assertEqual(dirty_carts.members(), {self.user.pk})
+
+        cache.delete(f'{cart.key}:lock')
+        flush_dirty_carts()
+        self.assertEqual(self.quantities(), {self.products[0].pk: 1})
+
+    def test_upsert_lines(self):
+        self.fill_cart()
+        cart_id = CartItem.objects.values_list('cart_id', flat=True).first()
+        product_id = self.products[0].pk
+        upsert_lines(cart_id, {product_id: 5}, increment=True)
+        self.assertEqual(self.quantities()[product_id], 7)
+        upsert_lines(cart_id, {product_id: 1})
+        self.assertEqual(self.quantities()[product_id], 1)
+
+
+class LineItemTotalsTests(StoreTestCase):
+    def test_cart_totals(self):
+        self.fill_cart()
+        items = CartItem.objects.filter(cart__user=self.user)
+        with self.assertNumQueries(1):
+            totals = items.totals()
+        self.assertEqual(totals, {
+            'total': sum(product.price * 2 for product in self.products),
+            'item_count': LINES,
+            'quantity': LINES * 2,
+        })
+        with self.assertNumQueries(1):
+            subtotals = {item.product_id: item.total_price for item in items.with_subtotals()}
+        self.assertEqual(subtotals[self.products[3].pk], Decimal('8.00'))
+
+    def test_order_totals_use_snapshot_price(self):
+        self.place_orders(count=1)
+        order = Order.objects.get()
+        order.items.filter(product=self.products[0]).update(unit_price=Decimal('50.00'))
+        order.items.filter(product=self.products[1]).update(unit_price=None)
+        self.assertEqual(
+            order.items.totals()['total'],
+            sum(product.price for product in self.products[1:]) + Decimal('50.00'),
+        )
+
+    def test_empty_totals(self):
+        self.assertEqual(CartItem.objects.none().totals()['total'], Decimal('0.00'))
+
+
+class SearchTests(StoreTestCase):
+    def names(self, query, **kwargs):
+        return [product.name for product in search.search_products(query, **kwargs)]
+
+    def test_every_term_matches_a_word_prefix(self):
+        Product.objects.create(name='Steel kettle', description='Boils fast', price=Decimal('20.00'), category='Home & Living', stock=1)
+        self.assertEqual(self.names('kett'), ['Steel kettle'])
+        self.assertEqual(self.names('kettle BOILS'), ['Steel kettle'])
+        self.assertEqual(self.names('home kettle'), ['Steel kettle'])
+        self.assertEqual(self.names('kettle gaming'), [])
+        self.assertEqual(self.names('ettle'), [])
+        self.assertEqual(search.search_products('  ').count(), LINES + 1)
+
+    def test_name_matches_rank_first(self):
+        Product.objects.create(name='Desk', description='Fits a lamp', price=Decimal('90.00'), category='Home & Living', stock=1)
+        Product.objects.create(name='Lamp', description='Brass', price=Decimal('45.00'), category='Home & Living', stock=1)
+        self.assertEqual(self.names('lamp'), ['Lamp', 'Desk'])
+
+    def test_queryset_is_searched_before_the_limit(self):
+        electronics = Product.objects.filter(category='Electronics')
+        results = list(search.search_products('product', queryset=electronics, limit=3))
+        self.assertEqual(len(results), 3)
+        self.assertEqual({product.category for product in results}, {'Electronics'})
+
+    def test_index_follows_changes(self):
+        product = self.products[0]
+        product.name = 'Renamed gadget'
+        product.save()
+        self.assertEqual(self.names('gadget'), ['Renamed gadget'])
+        product.delete()
+        self.assertEqual(self.names('gadget'), [])
+        search.rebuild_index()
+        self.assertEqual(len(self.names('product')), LINES - 1)
+
+
+class FacetTests(StoreTestCase):
+    def assertSummaryAccurate(self):
+        fresh = facets.aggregate(Product.objects.all())
+        cached = {category: facet for category, facet in facets.summary().items() if facet['count']}
+        self.assertEqual(cached, fresh)
+
+    def test_counts(self):
+        result = facets.category_facets(selected_category='Gaming')
+        self.assertEqual(result['categories'], [
+            {'name': 'Electronics', 'count': LINES // 2, 'in_stock': LINES // 2},
+            {'name': 'Gaming', 'count': LINES // 2, 'in_stock': LINES // 2},
+        ])
+        # Gaming products cost 1, 3, ..., 19
+        self.assertEqual([bucket['count'] for bucket in result['price_buckets']], [LINES // 2, 0, 0, 0, 0, 0])
+
+    def test_summary_is_served_from_cache(self):
+        facets.summary()
+        with self.assertNumQueries(0):
+            facets.category_facets()
+
+    def test_summary_is_adjusted_incrementally(self):
+        facets.summary()
+        product = self.products[0]
+        product.category = 'Books & Stationery'
+        product.price = Decimal('120.00')
+        product.stock = 0
+        product.save()
+        self.products[1].delete()
+        Product.objects.create(name='New', description='', price=Decimal('30.00'), category='Automotive', stock=5)
+        self.assertSummaryAccurate()
+
+    def test_checkout_sell_out_updates_in_stock(self):
+        facets.summary()
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock=2)
+        cart = CachedCart.for_user(self.user)
+        cart.add(product.pk, 2)
+        cart.flush()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('checkout'), {
+                'payment_method': 'cod',
+                'delivery_address': '1 Market Road',
+                'delivery_postal_code': '100001',
+                'delivery_country': 'Nigeria',
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 0)
+        self.assertSummaryAccurate()
+
+
+class ProductImageTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': media_root}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, width, height, name='photo.png'):
+        buffer = BytesIO()
+        Image.new('RGBA', (width, height), (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_variants_generated_on_upload(self):
+        product = self.products[0]
+        product.image = self.upload(700, 350)
+        product.save()
+        self.assertEqual(run_pending(), 1)
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {'source': product.image.name, 'width': 700, 'widths': [160, 320, 640]})
+        for width in (160, 320, 640):
+            for extension in images.VARIANT_FORMATS:
+                name = images.variant_name(product.image.name, width, extension)
+                with default_storage.open(name) as file, Image.open(file) as variant:
+                    self.assertEqual(variant.size, (width, width // 2))
+        self.assertTrue(images.thumbnail_url(product, 200).endswith('_320w.jpeg'))
+        self.assertIn('_640w.webp 640w', images.srcset(product, 'webp'))
+        self.assertTrue(images.srcset(product).endswith('.png 700w'))
+
+        # Replacing the image drops the old variants
+        old_name = images.variant_name(product.image.name, 160, 'webp')
+        product.image = self.upload(200, 100, name='small.png')
+        product.save()
+        run_pending()
+        product.refresh_from_db()
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(product.image_variants['widths'], [160])
+
+    def test_serializer_exposes_variants(self):
+        product = self.products[0]
+        product.image = self.upload(400, 400)
+        product.save()
+        run_pending()
+        data = self.client.get(reverse('product-list-create'), {'fields': 'id,images'}).json()['results']
+        listed = next(row for row in data if row['id'] == product.pk)
+        self.assertEqual([variant['width'] for variant in listed['images']['variants']], [160, 320])
+        self.assertTrue(listed['images']['variants'][0]['webp'].endswith('_160w.webp'))
+
+    def test_new_variants_change_the_etag(self):
+        url = reverse('product-list-create')
+        product = self.products[0]
+        product.image = self.upload(400, 400)
+        product.save()
+        etag = self.client.get(url)['ETag']
+        run_pending()
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class RelatedProductsTests(StoreTestCase):
+    def test_co_purchases_rank_first(self):
+        first, bought_with, *_ = self.products
+        self.place_orders(count=1)
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=first, quantity=1)
+        OrderItem.objects.create(order=order, product=bought_with, quantity=1)
+
+        self.assertEqual(related.compute_all(), LINES)
+        neighbours = related.related_products(first)
+        self.assertEqual(neighbours[0], bought_with)
+        self.assertEqual(len(neighbours), related.RELATED_LIMIT)
+
+    def test_same_category_fallback(self):
+        product = self.products[0]
+        neighbours = related.related_products(product)
+        self.assertEqual(len(neighbours), related.RELATED_LIMIT)
+        self.assertTrue(all(other.category == product.category for other in neighbours))
+        self.assertNotIn(product, neighbours)
+
+        # Served from the cache afterwards, and recomputed after an edit
+        with self.assertNumQueries(1):
+            related.related_products(product)
+        product.category = 'Electronics'
+        product.save()
+        self.assertTrue(all(other.category == 'Electronics' for other in related.related_products(product)))
+
+
+class OrderQueryBudgetTests(StoreTestCase):
+    def test_order_list(self):
+        self.place_orders()
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('99.00'))
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse('order-list-create'), {'include': 'items'})
+        orders = response.json()['results']
+        self.assertEqual(len(orders), 5)
+        self.assertEqual(orders[0]['items'][0]['unit_price'], '1.00')
+
+    def test_order_list_summary(self):
+        self.place_orders()
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('order-list-create'), {'page_size': 2})
+        page = response.json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertNotIn('items', page['results'][0])
+        self.assertIsNotNone(page['next'])
+
+    def test_order_list_filters(self):
+        self.place_orders(count=2)
+        Order.objects.filter(pk=Order.objects.first().pk).update(is_paid=True)
+        response = self.client.get(reverse('order-list-create'), {'is_paid': 'true', 'created_after': '2000-01-01'})
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.client.get(reverse('order-list-create'), {'created_before': '2000-01-01'})
+        self.assertEqual(response.json()['results'], [])
+        response = self.client.get(reverse('order-list-create'), {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        for value in ('2024-02-30', '2024-13-01T00:00'):
+            response = self.client.get(reverse('order-list-create'), {'created_after': value})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('created_after', response.json())
+
+    def test_payment_methods(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('payment-method-list-create'))
+        self.assertEqual(response.status_code, 200)
+
+
+class FastSerializerParityTests(StoreTestCase):
+    def test_products(self):
+        Product.objects.filter(pk=self.products[0].pk).update(image_variants={
+            'source': self.products[0].image.name, 'width': 800, 'widths': [160, 320],
+        })
+        Product.objects.filter(pk=self.products[1].pk).update(image_variants={'source': 'products/old.jpeg', 'widths': [160]})
+        Product.objects.filter(pk=self.products[2].pk).update(image='', category='Not a choice')
+        products = Product.objects.order_by('pk')
+
+        for fields in (None, ['id', 'price'], ['name', 'images', 'category_display']):
+            rows = products.values(*fast_serializers.product_columns(fields))
+            self.assertEqual(
+                fast_serializers.products(rows, fields),
+                ProductSerializer(products, many=True, fields=fields).data,
+            )
+
+    def test_orders(self):
+        self.place_orders(count=2)
+        Order.objects.filter(pk=Order.objects.first().pk).update(subtotal=Decimal('210.00'), total=Decimal('215.50'))
+        OrderItem.objects.filter(pk=OrderItem.objects.first().pk).update(unit_price=Decimal('0.10'), quantity=3)
+        orders = Order.objects.order_by('pk')
+        rows = orders.values(*fast_serializers.ORDER_COLUMNS)
+
+        self.assertEqual(fast_serializers.orders(rows), OrderSummarySerializer(orders, many=True).data)
+        orders = orders.prefetch_related(Prefetch('items', OrderItem.objects.order_by('pk')))
+        self.assertEqual(
+            fast_serializers.orders(rows, include_items=True),
+            OrderSerializer(orders, many=True).data,
+        )
+
+    def test_renderer(self):
+        data = {
+            'results': [{'price': Decimal('1.50'), 'at': timezone.now(), 'name': 'Caf\u00e9 \u2028 line'}],
+            1: None,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+class BulkTransferTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email='admin@example.com', password='secret-pass-123', is_staff=True)
+        self.client.force_login(self.admin)
+        self.async_client.force_login(self.admin)
+
+    async def export(self, name, file_format, **params):
+        # The web service runs under ASGI, so exports must stream there
+        response = await self.async_client.get(reverse(name, args=[file_format]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_export_products_csv(self):
+        rows = list(csv.DictReader(StringIO(await self.export('product-export', 'csv', category='Gaming'))))
+        self.assertEqual(len(rows), LINES // 2)
+        self.assertEqual(rows[0]['name'], 'Product 0')
+        self.assertEqual(rows[0]['price'], '1.00')
+
+    async def test_export_orders_ndjson(self):
+        await sync_to_async(self.place_orders)(count=3)
+        rows = [json.loads(line) for line in (await self.export('order-export', 'ndjson')).splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['user_email'], self.user.email)
+        self.assertEqual(rows[0]['payment_method'], 'cod')
+
+    def test_export_needs_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('product-export', args=['csv']))
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('product-export', args=['xml']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_is_chunked(self):
+        chunks = list(bulk.export(Product.objects.all(), bulk.PRODUCT_COLUMNS, 'csv', chunk_size=8))
+        # Header, then 8 + 8 + 4 rows
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [1, 8, 8, 4])
+
+    async def test_async_export_is_chunked(self):
+        chunks = [chunk async for chunk in bulk.aexport(Product.objects.all(), bulk.PRODUCT_COLUMNS, 'csv', chunk_size=8)]
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [1, 8, 8, 4])
+
+    def test_import_upserts(self):
+        facets.summary()
+        product = self.products[0]
+        rows = [
+            {'id': str(product.pk), 'name': 'Renamed', 'description': '', 'price': '9.50', 'category': 'Gaming', 'stock': '3'},
+            {'id': '', 'name': 'Supplier kettle', 'description': 'Steel', 'price': '20.00', 'category': 'Home & Living', 'stock': '7'},
+            {'id': '', 'name': 'Bad', 'description': '', 'price': 'free', 'category': 'Gaming', 'stock': '1'},
+            {'id': '999999', 'name': 'Gone', 'description': '', 'price': '1.00', 'category': 'Gaming', 'stock': '1'},
+        ]
+        with self.assertMaxQueries(8), self.captureOnCommitCallbacks(execute=True):
+            result = bulk.import_products(enumerate(rows, 2))
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual([(number, list(errors)) for number, errors in result.errors], [(4, ['price']), (5, ['id'])])
+
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.price, product.stock), ('Renamed', Decimal('9.50'), 3))
+        self.assertEqual([p.name for p in search.search_products('kettle')], ['Supplier kettle'])
+        self.assertEqual(facets.summary(), facets.rebuild())
+
+    def test_import_keeps_fields_a_row_leaves_out(self):
+        product, other = self.products[0], self.products[1]
+        Product.objects.filter(pk=product.pk).update(description='Hand-written copy')
+        rows = [
+            {'id': product.pk, 'name': 'Renamed', 'price': '9.50', 'category': 'Gaming', 'stock': 3},
+            {'id': other.pk, 'name': 'Other', 'description': 'New copy', 'price': '4.00', 'category': 'Gaming', 'stock': 1},
+        ]
+        result = bulk.import_products(enumerate(rows, 1))
+        self.assertEqual((result.created, result.updated, result.errors), (0, 2, []))
+
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((product.name, product.description, product.stock), ('Renamed', 'Hand-written copy', 3))
+        self.assertEqual((other.name, other.description), ('Other', 'New copy'))
+        self.assertEqual([p.pk for p in search.search_products('hand-written')], [product.pk])
+
+    def test_import_queries_per_batch(self):
+        rows = [
+            (number, {'name': f'Feed {number}', 'price': '5.00', 'category': 'Automotive', 'stock': '1'})
+            for number in range(250)
+        ]
+        with self.assertMaxQueries(3 * 4):
+            result = bulk.import_products(rows, batch_size=100)
+        self.assertEqual(result.created, 250)
+
+    def test_batch_create_and_update(self):
+        product, other = self.products[0], self.products[1]
+        items = [
+            {'name': 'Batch lamp', 'description': 'Brass', 'price': '45.00', 'category': 'Home & Living', 'stock': 4},
+            {'id': product.pk, 'price': '2.50'},
+            {'id': other.pk, 'name': 'Renamed', 'stock': 0},
+        ]
+        with self.assertMaxQueries(10):
+            response = self.client.post(reverse('product-batch'), items, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()], ['created', 'updated', 'updated'])
+
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((product.name, product.price, product.stock), ('Product 0', Decimal('2.50'), 100))
+        self.assertEqual((other.name, other.price, other.stock), ('Renamed', Decimal('2.00'), 0))
+        self.assertEqual([p.name for p in search.search_products('lamp')], ['Batch lamp'])
+
+    def test_batch_keeps_concurrent_changes(self):
+        product = self.products[0]
+        serializer = ProductBatchSerializer(data=[{'id': product.pk, 'price': '2.50'}])
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # A checkout between validation and the write
+        Product.objects.filter(pk=product.pk).update(stock=7)
+        bulk.save_products(serializer.validated_data)
+
+        product.refresh_from_db()
+        self.assertEqual((product.price, product.stock), (Decimal('2.50'), 7))
+
+        Product.objects.filter(pk=product.pk).delete()
+        with self.assertRaises(ValidationError):
+            bulk.save_products(serializer.validated_data)
+
+    def test_caches_change_once_committed(self):
+        facets.summary()
+        version = page_cache.catalog_version()
+        rows = [(1, {'name': 'Kettle', 'price': '5.00', 'category': 'Gaming', 'stock': 1})]
+        with self.captureOnCommitCallbacks() as callbacks:
+            bulk.import_products(rows)
+            self.assertEqual(page_cache.catalog_version(), version)
+            self.assertIsNotNone(cache.get(facets.FACETS_KEY))
+            with self.assertRaises(ValidationError), transaction.atomic():
+                bulk.import_products(rows)
+                raise ValidationError("rolled back")
+        # The rolled back import's invalidation went with it
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        self.assertNotEqual(page_cache.catalog_version(), version)
+        self.assertIsNone(cache.get(facets.FACETS_KEY))
+
+    def test_batch_is_all_or_nothing(self):
+        items = [
+            {'name': 'Valid', 'price': '5.00', 'category': 'Gaming', 'stock': 1},
+            {'name': 'No price', 'category': 'Gaming', 'stock': 1},
+            {'id': 999999, 'price': '1.00'},
+        ]
+        response = self.client.post(reverse('product-batch'), items, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertEqual(list(errors[1]), ['price'])
+        self.assertFalse(Product.objects.filter(name='Valid').exists())
+
+        response = self.client.post(reverse('product-batch'), items[2:], content_type='application/json')
+        self.assertEqual(list(response.json()[0]), ['id'])
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('product-batch'), items[:1], content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_commands_round_trip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'products.ndjson')
+        call_command('export_data', 'products', file_format='ndjson', output=path, stdout=StringIO())
+        with open(path) as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(len(rows), LINES)
+        for row in rows:
+            row['stock'] = 5
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+
+        stdout = StringIO()
+        call_command('import_products', path, stdout=stdout)
+        self.assertIn(f'Created 0 and updated {LINES} product(s)', stdout.getvalue())
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {5})
+
+
+@skipIf(routers.replica_configured(), 'a replica is configured; these tests add their own')
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing with a second SQLite file standing in for the replica."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # The alias isn't in DATABASES, so it is added here and connected
+        # explicitly (the test runner only sets up the configured ones).
+        connections.settings[routers.REPLICA_DB_ALIAS] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        self.addCleanup(self.remove_replica)
+        replica = connections[routers.REPLICA_DB_ALIAS]
+        replica.connect()
+        with replica.schema_editor() as editor:
+            editor.create_model(Product)
+            editor.create_model(RelatedProductList)
+
+        # Rows only the replica has, so reads show where they went
+        Product.objects.using(routers.REPLICA_DB_ALIAS).bulk_create([
+            Product(name='Replica copy', price=Decimal('5.00'), category='Gaming', stock=1),
+        ])
+        cache.clear()
+        routers.start_request()
+
+    def remove_replica(self):
+        connections[routers.REPLICA_DB_ALIAS].close()
+        del connections[routers.REPLICA_DB_ALIAS]
+        del connections.settings[routers.REPLICA_DB_ALIAS]
+        routers.start_request()
+
+    def read_from_replica(self):
+        return Product.objects.filter(name='Replica copy').exists()
+
+    def test_catalog_reads_use_replica(self):
+        self.assertTrue(self.read_from_replica())
+        # Other models stay on the primary
+        self.assertFalse(Order.objects.exists())
+
+    def test_reads_follow_writes_to_primary(self):
+        Product.objects.create(name='New', price=Decimal('1.00'), stock=1)
+        self.assertFalse(self.read_from_replica())
+        self.assertTrue(Product.objects.filter(name='New').exists())
+
+    def test_reads_in_transaction_use_primary(self):
+        with transaction.atomic():
+            self.assertFalse(self.read_from_replica())
+        self.assertTrue(self.read_from_replica())
+
+    def test_view_overrides(self):
+        self.assertFalse(routers.use_primary(self.read_from_replica)())
+        self.assertTrue(routers.use_replica(self.read_from_replica)())
+
+    def test_pin_cookie_after_write(self):
+        response = self.client.get(reverse('homepage'))
+        self.assertContains(response, 'Replica copy')
+        self.assertNotIn(routers.REPLICA_PIN_COOKIE, response.cookies)
+
+        user = User.objects.create_user(email='shopper@example.com', password='secret-pass-123')
+        response = self.client.post(reverse('login'), {'email': user.email, 'password': 'secret-pass-123'})
+        self.assertIn(routers.REPLICA_PIN_COOKIE, response.cookies)
+
+        cache.clear()
+        response = self.client.get(reverse('homepage'))
+        self.assertNotContains(response, 'Replica copy')
+
+    def test_catalog_changes_are_read_from_primary(self):
+        url = reverse('homepage')
+        self.assertContains(self.client.get(url), 'Replica copy')
+        # A change the replica may not have applied yet
+        page_cache.bump_catalog_version()
+        self.assertNotContains(self.client.get(url), 'Replica copy')
+        user = User.objects.create_user(email='shopper@example.com', password='secret-pass-123')
+        self.client.force_login(user)
+        results = self.client.get(reverse('product-list-create')).json()['results']
+        self.assertNotIn('Replica copy', [product['name'] for product in results])
+        self.client.logout()
+
+        later = time.time() + routers.REPLICA_PIN_SECONDS
+        with mock.patch('store.page_cache.time.time', return_value=later):
+            # The page cached under the new version came from the primary
+            self.assertNotContains(self.client.get(url), 'Replica copy')
+            self.assertContains(self.client.get(url, {'category': 'Gaming'}), 'Replica copy')
+
+
+class QueryAuditTests(StoreTestCase):
+    def test_store_queries_use_indexes(self):
+        self.place_orders(count=2)
+        self.fill_cart()
+        findings, explained = query_audit.audit(self.user)
+        self.assertGreater(explained, 20)
+        self.assertEqual([(f.page, f.detail) for f in findings if not f.expected], [])
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('audit_queries', user=self.user.email, stdout=stdout)
+        self.assertIn('0 unindexed scan(s)', stdout.getvalue())
+
+    def test_cart_lines_are_unique(self):
+        self.fill_cart()
+        item = CartItem.objects.first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart_id=item.cart_id, product_id=item.product_id)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ProductListCreateView, OrderListCreateView, HomeView, ProductDetail,  AddToCartView, CartView, CheckoutPageView
+from .views import ProductListCreateView, ProductBatchView, ProductExportView, OrderListCreateView, OrderExportView, HomeView, ProductDetail,  AddToCartView, CartView, CheckoutPageView
 from django.contrib.auth import views as auth_views
 from . import views
 from django.conf import settings
@@ -25,8 +25,12 @@ from .views import PaymentMethodListCreateView
 urlpatterns = [
     path('', views.home, name="homepage"),
     path('products/', ProductListCreateView.as_view(), name='product-list-create'),
-    path('product/<int:pk>/', ProductDetail.as_view(), name='product_detail'),
+    path('products/suggest/', views.product_suggest, name='product-suggest'),
+    path('products/batch/', ProductBatchView.as_view(), name='product-batch'),
+    path('products/export.<str:file_format>', ProductExportView.as_view(), name='product-export'),
+    path('product/<int:pk>/', views.api_login_required(ProductDetail.as_view()), name='product_detail'),
     path('orders/', OrderListCreateView.as_view(), name='order-list-create'),
+    path('orders/export.<str:file_format>', OrderExportView.as_view(), name='order-export'),
     path('category/<str:category_name>/', views.category_view, name='category'),  # ← this line is key
     path('product/<int:id>/', views.product_detail, name='product_detail'),
     path("home/", HomeView.as_view(), name="home"),
@@ -1,25 +1,44 @@
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import logout, login as django_login, authenticate, get_user_model
+from django.contrib.auth import logout, authenticate, get_user_model
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.views import redirect_to_login
 from django.utils.decorators import method_decorator
-from django.http import Http404
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 from rest_framework.views import APIView
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework import status, permissions, views
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.exceptions import APIException, AuthenticationFailed, ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from accounts import sessions
+from core.routers import use_primary, use_replica
 from accounts.serializers import SignupSerializer, LoginSerializer
-from accounts.models import Profile
 from store.models import Product
+from store import bulk, facets, fast_serializers, page_cache, related, search
 
 from .models import Cart, CartItem, Order, OrderItem, PaymentMethod, DeliveryService
-from .serializers import CartSerializer, CartItemSerializer, ProductSerializer, OrderSerializer, PaymentMethodSerializer, DeliveryServiceSerializer
+from .serializers import CartSerializer, CartItemSerializer, ProductSerializer, ProductBatchSerializer, ProductImportSerializer, OrderSerializer, OrderSummarySerializer, PaymentMethodSerializer, DeliveryServiceSerializer
+from .pagination import KeysetPagination
+from .checkout import place_order, CheckoutError
+from .cart import CachedCart
 
 User = get_user_model()
 
@@ -31,19 +50,9 @@ class CheckoutPageView(APIView):
         operation_description="Displays the checkout page with cart summary",
         responses={200: "Checkout page rendered"}
     )
+    @use_primary
     def get(self, request):
-        user = request.user
-        cart = Cart.objects.filter(user=user).first()
-
-        if not cart:
-            return render(request, "checkout.html", {
-                "cart_items": [],
-                "total": 0,
-                "payment_methods": PaymentMethod.objects.all(),
-                "delivery_services": DeliveryService.objects.all(),
-            })
-
-        cart_items = cart.items.select_related("product").all()
+        cart_items = CachedCart.for_user(request.user).lines()
         total = sum(item.total_price for item in cart_items)
 
         context = {
@@ -72,9 +81,11 @@ class CheckoutPageView(APIView):
     )
     def post(self, request):
         user = request.user
+        cached_cart = CachedCart.for_user(user)
+        cached_cart.flush()
         cart = Cart.objects.filter(user=user).first()
 
-        if not cart or not cart.items.exists():
+        if not cart:
             return Response({"message": "Your cart is empty."}, status=400)
 
         payment_method_name = request.data.get("payment_method")
@@ -89,23 +100,19 @@ class CheckoutPageView(APIView):
         payment_method = get_object_or_404(PaymentMethod, name=payment_method_name)
         delivery_service = get_object_or_404(DeliveryService, name=delivery_service_name) if delivery_service_name else None
 
-        order = Order.objects.create(
-            user=user,
-            payment_method=payment_method,
-            delivery_service=delivery_service,
-            delivery_address=delivery_address,
-            delivery_postal_code=delivery_postal_code,
-            delivery_country=delivery_country,
-        )
-
-        for item in cart.items.select_related("product").all():
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity
+        try:
+            order = place_order(
+                cart,
+                payment_method=payment_method,
+                delivery_service=delivery_service,
+                delivery_address=delivery_address,
+                delivery_postal_code=delivery_postal_code,
+                delivery_country=delivery_country,
             )
+        except CheckoutError as exc:
+            return Response({"message": str(exc)}, status=400)
 
-        cart.items.all().delete()
+        cached_cart.invalidate()
 
         return Response({
             "message": "Order placed successfully",
@@ -120,9 +127,13 @@ class RemoveFromCartView(APIView):
         if not request.user.is_authenticated:
             raise AuthenticationFailed('User is not authenticated')
 
-        cart_item = get_object_or_404(CartItem, id=cart_item_id, cart__user=request.user)
+        cart = CachedCart.for_user(request.user)
+        try:
+            product_id = cart.product_id_for_item(cart_item_id)
+        except CartItem.DoesNotExist:
+            raise Http404("Cart item not found")
 
-        cart_item.delete()
+        cart.remove(product_id)
 
         return Response({
             'message': 'Product removed from cart successfully!',
@@ -132,8 +143,12 @@ class UpdateCartItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, cart_item_id):
-        cart_item = get_object_or_404(CartItem, id=cart_item_id, cart__user=request.user)
-        
+        cart = CachedCart.for_user(request.user)
+        try:
+            product_id = cart.product_id_for_item(cart_item_id)
+        except CartItem.DoesNotExist:
+            raise Http404("Cart item not found")
+
         try:
             quantity = int(request.data.get('quantity'))
         except (TypeError, ValueError):
@@ -142,16 +157,16 @@ class UpdateCartItemView(APIView):
         if quantity <= 0:
             return Response({"error": "Quantity must be greater than 0"}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item.quantity = quantity
-        cart_item.save()
+        cart.set_quantity(product_id, quantity)
+        line = cart.line(product_id)
 
         return Response({
             'message': 'Cart item updated successfully!',
             'product': {
-                'id': cart_item.product.id,
-                'name': cart_item.product.name,
-                'quantity': cart_item.quantity,
-                'total_price': cart_item.total_price,
+                'id': line.product.id,
+                'name': line.product.name,
+                'quantity': line.quantity,
+                'total_price': line.total_price,
             }
         }, status=status.HTTP_200_OK)
 
@@ -160,28 +175,19 @@ class AddToCartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, product_id):
+        quantity = int(request.POST.get('quantity', 1))
+
         try:
-            product = Product.objects.get(id=product_id)
+            CachedCart.for_user(request.user).add(product_id, quantity)
         except Product.DoesNotExist:
             raise Http404("Product not found")
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-
-        quantity = int(request.POST.get('quantity', 1))
-
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-
-        if not created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-        cart_item.save()
-
         return redirect('cart-detail')
 
 class CartView(APIView): 
+    @use_primary
     def get(self, request):
-        cart_items = CartItem.objects.filter(cart__user=request.user)
+        cart_items = CachedCart.for_user(request.user).lines()
         total_price = sum(item.total_price for item in cart_items)
         return render(request, 'cart.html', {
             'cart_items': cart_items,
@@ -189,21 +195,33 @@ class CartView(APIView):
         })
 
     def post(self, request):
-        if 'remove_item_id' in request.POST:
-            item_id = request.POST.get('remove_item_id')
-            CartItem.objects.filter(id=item_id, cart__user=request.user).delete()
+        cart = CachedCart.for_user(request.user)
+
+        if 'remove_product_id' in request.POST or 'remove_item_id' in request.POST:
+            product_id = self.posted_product_id(cart, request.POST, 'remove_product_id', 'remove_item_id')
+            if product_id is not None:
+                cart.remove(product_id)
 
-        elif 'quantity' in request.POST and 'item_id' in request.POST:
-            item_id = request.POST.get('item_id')
+        elif 'quantity' in request.POST:
+            product_id = self.posted_product_id(cart, request.POST, 'product_id', 'item_id')
             quantity = int(request.POST.get('quantity', 1))
-            try:
-                item = CartItem.objects.get(id=item_id, cart__user=request.user)
-                item.quantity = quantity
-                item.save()
-            except CartItem.DoesNotExist:
-                pass
+            if product_id is not None and quantity > 0:
+                cart.set_quantity(product_id, quantity)
 
-        return self.get(request) 
+        return self.get(request)
+
+    @staticmethod
+    def posted_product_id(cart, data, product_key, item_key):
+        # The cart page posts product ids; item ids are CartItem ids sent by
+        # older clients.
+        try:
+            if product_key in data:
+                return int(data[product_key])
+            if item_key in data:
+                return cart.product_id_for_item(data[item_key])
+        except (CartItem.DoesNotExist, ValueError):
+            pass
+        return None
 
 class CartItemView(APIView):
     permission_classes = [IsAuthenticated]
@@ -215,15 +233,13 @@ class CartItemView(APIView):
             raise Http404("Cart not found")
 
         product_id = request.data.get("product")
-        quantity = request.data.get("quantity", 1)
+        quantity = int(request.data.get("quantity", 1))
 
         try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+            CachedCart.for_user(request.user).add(int(product_id), quantity)
+        except (Product.DoesNotExist, TypeError, ValueError):
             raise Http404("Product not found")
 
-        cart_item = CartItem.objects.create(cart=cart, product=product, quantity=quantity)
-
         return render(request, 'cart.html', {'cart': cart})
 
     def delete(self, request, cart_id, item_id, format=None):
@@ -232,68 +248,106 @@ class CartItemView(APIView):
         except Cart.DoesNotExist:
             raise Http404("Cart not found")
 
+        cached_cart = CachedCart.for_user(request.user)
         try:
-            cart_item = CartItem.objects.get(id=item_id, cart=cart)
+            product_id = cached_cart.product_id_for_item(item_id)
         except CartItem.DoesNotExist:
             raise Http404("Cart item not found")
 
-        cart_item.delete()
+        cached_cart.remove(product_id)
 
         return render(request, 'cart.html', {'cart': cart})
     
-class ProductDetail(APIView):
-    @swagger_auto_schema(auto_schema=None)
-    def get(self, request, pk):
-        product = get_object_or_404(Product, pk=pk)
-        
-        related_products = Product.objects.filter(
-            category=product.category
-        ).exclude(id=product.id)[:4]
+def api_user(request):
+    """The user the API's authenticators (JWT, then session) find on ``request``."""
+    request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return request.user
+    except APIException:
+        # An invalid or expired token
+        return AnonymousUser()
+
+
+def api_login_required(view):
+    """
+    ``login_required`` for async views that also accepts what DRF views do,
+    so API clients holding a JWT get the page too. Anyone else is sent to
+    log in.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await sync_to_async(api_user)(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+class ProductDetail(View):
+    # api_login_required is applied in urls.py; method_decorator can't wrap
+    # async methods.
+    @use_replica
+    async def get(self, request, pk):
+        async def get_context():
+            try:
+                product = await Product.objects.aget(pk=pk)
+            except Product.DoesNotExist:
+                raise Http404("Product not found")
+            return {
+                'product': product,
+                'related_products': await related.arelated_products(product),
+            }
 
-        return render(request, 'product_detail.html', {
-            'product': product,
-            'related_products': related_products
-        })
+        return await page_cache.arender_catalog_page(request, 'product_detail.html', get_context, shared=True)
 
 @method_decorator(login_required, name='dispatch')
 class HomeView(views.APIView):
     def get(self, request):
         return render(request, "home.html", {})
 
-def home(request):
-    profile = None
-    if request.user.is_authenticated:
-        profile, _ = Profile.objects.get_or_create(user=request.user)
-
+@use_replica
+async def home(request):
     search_query = request.GET.get('search', '')
     selected_category = request.GET.get('category', '')
 
-    products = Product.objects.all()
-
-    if search_query:
-        products = products.filter(name__icontains=search_query)
-
-    if selected_category:
-        products = products.filter(category=selected_category)
+    async def get_context():
+        products = Product.objects.all()
+        if selected_category:
+            products = products.filter(category=selected_category)
+
+        matches = None
+        if search_query:
+            # Searched within the category, so the result limit can't drop
+            # its matches; facets count the matches in every category.
+            products = await sync_to_async(search.search_products)(search_query, queryset=products)
+            matches = await sync_to_async(search.search_products)(search_query) if selected_category else products
+
+        facet_counts = await sync_to_async(facets.category_facets)(matches, selected_category)
+
+        return {
+            'products': products,
+            'categories': facet_counts['categories'],
+            'selected_category': selected_category,
+        }
 
-    categories = Product.objects.values_list('category', flat=True).distinct()
+    return await page_cache.arender_catalog_page(request, 'home.html', get_context)
 
-    return render(request, 'home.html', {
-        'products': products,
-        'categories': categories,
-        'selected_category': selected_category,
-    })
+def product_suggest(request):
+    query = request.GET.get('q', '')
+    return JsonResponse({'results': search.suggest(query)})
 
-def category_view(request, category_name):
-    products = Product.objects.filter(category=category_name)
-    
-    categories = sorted({cat[0] for cat in Product.CATEGORY_CHOICES})
+@use_replica
+async def category_view(request, category_name):
+    async def get_context():
+        facet_counts = await sync_to_async(facets.category_facets)(selected_category=category_name)
+        return {
+            'products': Product.objects.filter(category=category_name),
+            'categories': facet_counts['categories'],
+            'selected_category': category_name,
+        }
 
-    return render(request, 'home.html', {
-        'products': products,
-        'categories': categories,
-        'selected_category': category_name
-    })
+    return await page_cache.arender_catalog_page(request, 'home.html', get_context)
 def product_detail(request, id):
     try:
         product = Product.objects.get(id=id)
@@ -318,7 +372,7 @@ class SignupView(views.APIView):
         serializer = SignupSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            django_login(request, user)
+            sessions.login(request, user)
             refresh = RefreshToken.for_user(user)
 
             if request.query_params.get("redirect") == "true":
@@ -356,7 +410,7 @@ class LoginView(views.APIView):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            django_login(request, user)
+            sessions.login(request, user)
             refresh = RefreshToken.for_user(user)
 
             if request.query_params.get("redirect") == "true":
@@ -380,12 +434,56 @@ class HomeView(views.APIView):
     def get(self, request):
         return render(request, "home.html", {"user": request.user})
     
+def parse_product_fields(params):
+    if not params.get('fields'):
+        return None
+    fields = [name.strip() for name in params['fields'].split(',') if name.strip()]
+    unknown = set(fields) - set(ProductSerializer.Meta.fields)
+    if unknown:
+        raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}"]})
+    return fields
+
+def filter_products(products, params):
+    if params.get('category'):
+        products = products.filter(category=params['category'])
+
+    for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+        if params.get(param):
+            try:
+                value = Decimal(params[param])
+            except InvalidOperation:
+                value = None
+            if value is None or not value.is_finite():
+                raise ValidationError({param: ["A valid number is required."]})
+            products = products.filter(**{lookup: value})
+
+    return products
+
 class ProductListCreateView(views.APIView):
-    @swagger_auto_schema(responses={200: ProductSerializer(many=True)})
+    pagination_class = KeysetPagination
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Opaque cursor from the previous page'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Products per page (max 100)'),
+            openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Comma-separated fields to return, e.g. id,name,price'),
+            openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('min_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('max_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+        ],
+        responses={200: ProductSerializer(many=True)}
+    )
+    @method_decorator(cache_control(**page_cache.CATALOG_API_CACHE_CONTROL))
+    @method_decorator(condition(etag_func=page_cache.api_etag, last_modified_func=page_cache.api_last_modified))
+    @use_replica
     def get(self, request):
-        products = Product.objects.all()
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        fields = parse_product_fields(request.query_params)
+        products = filter_products(Product.objects.all(), request.query_params)
+        rows = products.values(*fast_serializers.product_columns(fields))
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(fast_serializers.products(page, fields))
 
     @swagger_auto_schema(request_body=ProductSerializer)
     def post(self, request):
@@ -395,14 +493,83 @@ class ProductListCreateView(views.APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ProductBatchView(views.APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Create and partially update up to 1000 products in one transaction. Items without "
+            "an id are created; items with one update only the fields they send. If any item is "
+            "invalid nothing is saved and the response lists each item's errors ({} when valid)."
+        ),
+        request_body=ProductImportSerializer(many=True),
+        responses={200: "A {status, product} result per item, in request order", 400: "Errors per item"},
+    )
+    def post(self, request):
+        serializer = ProductBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        results = bulk.save_products(serializer.validated_data)
+        data = ProductSerializer([product for _, product in results], many=True).data
+        return Response([
+            {'status': 'created' if created else 'updated', 'product': product}
+            for (created, _), product in zip(results, data)
+        ])
+
+def parse_datetime_param(params, name):
+    value = params[name]
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day is not None else None
+    except ValueError:
+        # Well-formed but not a real date, e.g. 2024-02-30
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Use YYYY-MM-DD or an ISO 8601 datetime."]})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def filter_orders(orders, params):
+    if params.get('is_paid'):
+        is_paid = params['is_paid'].lower()
+        if is_paid not in ('true', 'false'):
+            raise ValidationError({'is_paid': ["Must be true or false."]})
+        orders = orders.filter(is_paid=is_paid == 'true')
+
+    # Plain column comparisons (no __date) so the (user, created_at) index applies
+    if params.get('created_after'):
+        orders = orders.filter(created_at__gte=parse_datetime_param(params, 'created_after'))
+    if params.get('created_before'):
+        orders = orders.filter(created_at__lt=parse_datetime_param(params, 'created_before'))
+
+    return orders
+
 class OrderListCreateView(views.APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
-    @swagger_auto_schema(responses={200: OrderSerializer(many=True)})
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Opaque cursor from the previous page'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Orders per page (max 100)'),
+            openapi.Parameter('include', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Pass "items" to embed order lines'),
+            openapi.Parameter('is_paid', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('created_after', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Inclusive lower bound (date or datetime)'),
+            openapi.Parameter('created_before', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Exclusive upper bound (date or datetime)'),
+        ],
+        responses={200: OrderSummarySerializer(many=True)}
+    )
     def get(self, request):
-        orders = Order.objects.filter(user=request.user)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        orders = filter_orders(Order.objects.filter(user=request.user), request.query_params)
+        include_items = 'items' in request.query_params.get('include', '').split(',')
+        rows = orders.values(*fast_serializers.ORDER_COLUMNS)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(fast_serializers.orders(page, include_items))
 
     @swagger_auto_schema(request_body=OrderSerializer)
     def post(self, request):
@@ -412,6 +579,46 @@ class OrderListCreateView(views.APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ExportView(views.APIView):
+    """Base for the CSV/NDJSON exports; see store/bulk.py."""
+    permission_classes = [IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The response isn't rendered by DRF, so don't refuse Accept: text/csv
+        return super().perform_content_negotiation(request, force=True)
+
+    def export(self, queryset, columns, file_format, filename):
+        if file_format not in bulk.FORMATS:
+            raise Http404(f"Unknown export format {file_format!r}.")
+        return bulk.export_response(queryset, columns, file_format, filename)
+
+class ProductExportView(ExportView):
+    @swagger_auto_schema(
+        operation_description="Stream every product as CSV or NDJSON (admins only).",
+        manual_parameters=[
+            openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('min_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('max_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+        ],
+    )
+    @use_replica
+    def get(self, request, file_format):
+        products = filter_products(Product.objects.all(), request.query_params)
+        return self.export(products, bulk.PRODUCT_COLUMNS, file_format, 'products')
+
+class OrderExportView(ExportView):
+    @swagger_auto_schema(
+        operation_description="Stream every order as CSV or NDJSON (admins only).",
+        manual_parameters=[
+            openapi.Parameter('is_paid', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('created_after', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Inclusive lower bound (date or datetime)'),
+            openapi.Parameter('created_before', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Exclusive upper bound (date or datetime)'),
+        ],
+    )
+    def get(self, request, file_format):
+        orders = filter_orders(Order.objects.all(), request.query_params)
+        return self.export(orders, bulk.ORDER_COLUMNS, file_format, 'orders')
+
 class AuthView(APIView):
     @swagger_auto_schema(
         operation_summary="Signup or Login and Render auth.html",
@@ -443,7 +650,7 @@ class AuthView(APIView):
             serializer = SignupSerializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.save()
-                login(request, user)
+                sessions.login(request, user, session=True)
                 refresh = RefreshToken.for_user(user)
                 return render(request, 'auth.html', {
                     "message": "Signup successful",
@@ -460,7 +667,7 @@ class AuthView(APIView):
             serializer = LoginSerializer(data=request.data)
             if serializer.is_valid():
                 user = serializer.validated_data["user"]
-                login(request, user)
+                sessions.login(request, user, session=True)
                 refresh = RefreshToken.for_user(user)
                 return render(request, 'auth.html', {
                     "message": "Login successful",
@@ -0,0 +1,27 @@
+from django.contrib import admin
+
+from .models import DeadTask, Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'queue', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'created_at')
+    list_filter = ('queue', 'name')
+    ordering = ('run_after', 'id')
+
+
+@admin.register(DeadTask)
+class DeadTaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'attempts', 'created_at', 'failed_at')
+    list_filter = ('name',)
+    ordering = ('-failed_at',)
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected tasks")
+    def requeue(self, request, queryset):
+        Task.objects.bulk_create([
+            Task(name=dead.name, queue=dead.queue, args=dead.args, kwargs=dead.kwargs)
+            for dead in queryset
+        ])
+        count, _ = queryset.delete()
+        self.message_user(request, f"Requeued {count} task(s).")
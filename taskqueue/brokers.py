@@ -0,0 +1,113 @@
+"""
+Where queued tasks are kept between ``delay()`` and the worker.
+
+``DatabaseBroker`` (the default) stores them in the ``Task`` table, so the
+queue needs nothing beyond the database and a queued task commits or rolls
+back with the request's transaction. Set ``TASK_BROKER`` to the dotted path
+of another ``BaseBroker`` subclass to swap it out; ``ImmediateBroker`` runs
+tasks inline, which is handy in development.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import DeadTask, Task
+from .registry import TASK_DEFAULT_QUEUE, get_task
+
+TASK_BROKER = getattr(settings, 'TASK_BROKER', 'taskqueue.brokers.DatabaseBroker')
+# A task locked for longer than this is assumed to belong to a dead worker.
+TASK_LOCK_TIMEOUT = getattr(settings, 'TASK_LOCK_TIMEOUT', 5 * 60)
+
+
+class BaseBroker:
+    def enqueue(self, name, args, kwargs, max_attempts, countdown=0, queue=TASK_DEFAULT_QUEUE):
+        """Store a task; returns an identifier for it."""
+        raise NotImplementedError
+
+    def reserve(self, worker_id, limit, queues=None):
+        """
+        Claim up to ``limit`` due tasks for ``worker_id``, from ``queues`` if
+        given, else from any queue; returns ``Task``-like jobs.
+        """
+        raise NotImplementedError
+
+    def complete(self, job):
+        raise NotImplementedError
+
+    def retry(self, job, error, countdown):
+        raise NotImplementedError
+
+    def bury(self, job, error):
+        """Move a task that won't be retried to the dead-letter table."""
+        raise NotImplementedError
+
+
+class DatabaseBroker(BaseBroker):
+    def enqueue(self, name, args, kwargs, max_attempts, countdown=0, queue=TASK_DEFAULT_QUEUE):
+        task = Task.objects.create(
+            name=name,
+            queue=queue,
+            args=args,
+            kwargs=kwargs,
+            max_attempts=max_attempts,
+            run_after=timezone.now() + timedelta(seconds=countdown),
+        )
+        return task.pk
+
+    def reserve(self, worker_id, limit, queues=None):
+        now = timezone.now()
+        available = Q(locked_at__isnull=True) | Q(locked_at__lt=now - timedelta(seconds=TASK_LOCK_TIMEOUT))
+        due = Task.objects.filter(available, run_after__lte=now)
+        if queues:
+            due = due.filter(queue__in=queues)
+        candidates = list(due.order_by('run_after', 'id').values_list('pk', flat=True)[:limit])
+        # Each claim is a conditional UPDATE, so when several workers race
+        # for a task exactly one of them gets a row count of 1.
+        claimed = [
+            pk for pk in candidates
+            if due.filter(pk=pk).update(locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1)
+        ]
+        return list(Task.objects.filter(pk__in=claimed, locked_by=worker_id).order_by('run_after', 'id'))
+
+    def complete(self, job):
+        Task.objects.filter(pk=job.pk).delete()
+
+    def retry(self, job, error, countdown):
+        Task.objects.filter(pk=job.pk).update(
+            locked_by='',
+            locked_at=None,
+            last_error=error,
+            run_after=timezone.now() + timedelta(seconds=countdown),
+        )
+
+    def bury(self, job, error):
+        with transaction.atomic(using=Task.objects.db):
+            DeadTask.objects.create(
+                name=job.name,
+                queue=job.queue,
+                args=job.args,
+                kwargs=job.kwargs,
+                attempts=job.attempts,
+                error=error,
+                created_at=job.created_at,
+            )
+            Task.objects.filter(pk=job.pk).delete()
+
+
+class ImmediateBroker(BaseBroker):
+    """Run tasks as soon as they're queued, in the calling thread. Errors propagate."""
+
+    def enqueue(self, name, args, kwargs, max_attempts, countdown=0, queue=TASK_DEFAULT_QUEUE):
+        get_task(name)(*args, **kwargs)
+        return None
+
+    def reserve(self, worker_id, limit, queues=None):
+        return []
+
+
+def get_broker():
+    return import_string(TASK_BROKER)()
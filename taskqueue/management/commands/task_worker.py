@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from taskqueue.worker import TASK_POLL_INTERVAL, TASK_WORKER_CONCURRENCY, Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks. Stops cleanly on SIGINT/SIGTERM."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=TASK_WORKER_CONCURRENCY,
+                            help="Number of tasks to run at once.")
+        parser.add_argument('--poll-interval', type=float, default=TASK_POLL_INTERVAL,
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once the queue is empty instead of waiting for more.")
+        parser.add_argument('--queue', action='append', dest='queues',
+                            help="Only run tasks from this queue; repeat for more. Default: every queue.")
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'],
+                        queues=options['queues'])
+        signal.signal(signal.SIGINT, worker.stop)
+        signal.signal(signal.SIGTERM, worker.stop)
+
+        self.stdout.write(f"Worker {worker.worker_id} started with concurrency {worker.concurrency}.")
+        processed = worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} task(s)."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskqueue', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deadtask',
+            name='queue',
+            field=models.CharField(default='default', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='queue',
+            field=models.CharField(default='default', max_length=50),
+        ),
+    ]
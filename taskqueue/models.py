@@ -0,0 +1,40 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """A queued call of a registered task, until it succeeds or is buried."""
+    name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_after', 'id'], name='task_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+
+class DeadTask(models.Model):
+    """A task that failed ``max_attempts`` times, kept for inspection and requeueing."""
+    name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField()
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} (failed {self.failed_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,77 @@
+"""
+Task registration.
+
+Decorating a function with ``@task`` registers it under its dotted path and
+adds ``delay()``, which queues a call instead of making it::
+
+    @task(max_attempts=5)
+    def send_receipt(order_id):
+        ...
+
+    send_receipt.delay(order.pk)
+
+Arguments are stored as JSON, so pass ids rather than model instances.
+
+Each task belongs to a queue (``TASK_DEFAULT_QUEUE`` unless given), and a
+worker can be limited to some queues, e.g. to run tasks that read uploaded
+files on the machine that has them.
+"""
+from django.conf import settings
+
+TASK_MAX_ATTEMPTS = getattr(settings, 'TASK_MAX_ATTEMPTS', 3)
+# Seconds before the first retry; doubled for each further attempt.
+TASK_RETRY_DELAY = getattr(settings, 'TASK_RETRY_DELAY', 10)
+TASK_DEFAULT_QUEUE = getattr(settings, 'TASK_DEFAULT_QUEUE', 'default')
+
+registry = {}
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts, retry_delay, queue):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue = queue
+        self.__doc__ = func.__doc__
+        self.__wrapped__ = func
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def delay(self, *args, **kwargs):
+        """Queue a call with these arguments."""
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, countdown=0):
+        """Queue a call, to run no sooner than ``countdown`` seconds from now."""
+        from .brokers import get_broker
+
+        return get_broker().enqueue(self.name, list(args), kwargs or {}, self.max_attempts, countdown, self.queue)
+
+    def retry_after(self, attempts):
+        return self.retry_delay * 2 ** (attempts - 1)
+
+
+def task(func=None, *, name=None, max_attempts=TASK_MAX_ATTEMPTS, retry_delay=TASK_RETRY_DELAY,
+         queue=TASK_DEFAULT_QUEUE):
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+        registry[task_name] = TaskFunction(func, task_name, max_attempts, retry_delay, queue)
+        return registry[task_name]
+
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    try:
+        return registry[name]
+    except KeyError:
+        raise UnknownTask(f"No task registered as {name!r}") from None
@@ -0,0 +1,101 @@
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+
+from .brokers import DatabaseBroker
+from .models import DeadTask, Task
+from .registry import task
+from .worker import Worker, run_pending
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2, retry_delay=60)
+def always_fails():
+    raise RuntimeError("boom")
+
+
+@task(queue='media')
+def record_media(value):
+    calls.append(value)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_until_the_worker_runs(self):
+        record.delay('a')
+        record.delay('b')
+        self.assertEqual(calls, [])
+        self.assertEqual(Task.objects.count(), 2)
+
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_countdown(self):
+        record.enqueue(['later'], countdown=60)
+        self.assertEqual(run_pending(), 0)
+        Task.objects.update(run_after=timezone.now())
+        self.assertEqual(run_pending(), 1)
+
+    def test_failed_task_is_retried_then_buried(self):
+        always_fails.delay()
+        with self.assertLogs('taskqueue.worker', 'WARNING'):
+            run_pending()
+        queued = Task.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('RuntimeError: boom', queued.last_error)
+        self.assertGreater(queued.run_after, timezone.now())
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('taskqueue.worker', 'ERROR'):
+            run_pending()
+        self.assertFalse(Task.objects.exists())
+        dead = DeadTask.objects.get()
+        self.assertEqual((dead.name, dead.attempts), (always_fails.name, 2))
+
+    def test_unknown_task_is_buried(self):
+        Task.objects.create(name='taskqueue.tests.removed')
+        with self.assertLogs('taskqueue.worker', 'ERROR'):
+            run_pending()
+        self.assertEqual(DeadTask.objects.get().name, 'taskqueue.tests.removed')
+
+    def test_tasks_are_claimed_once(self):
+        record.delay('once')
+        broker = DatabaseBroker()
+        self.assertEqual(len(broker.reserve('worker-1', 10)), 1)
+        self.assertEqual(broker.reserve('worker-2', 10), [])
+
+    def test_workers_run_their_queues(self):
+        record.delay('default')
+        record_media.delay('media')
+        self.assertEqual(run_pending(queues=['media']), 1)
+        self.assertEqual(calls, ['media'])
+        self.assertEqual(Task.objects.get().queue, 'default')
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ['media', 'default'])
+
+    def test_worker_runs_a_batch_per_poll(self):
+        for value in range(5):
+            record.delay(value)
+        self.assertEqual(Worker(concurrency=1).run(burst=True), 5)
+        self.assertEqual(sorted(calls), list(range(5)))
+
+    def test_send_email_task(self):
+        from accounts.tasks import send_email
+
+        send_email.delay(
+            subject='Activate', body='text', from_email='shop@example.com', to=['a@example.com'],
+            alternatives=[['<p>html</p>', 'text/html']],
+        )
+        self.assertEqual(mail.outbox, [])
+        run_pending()
+        self.assertEqual(mail.outbox[0].subject, 'Activate')
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
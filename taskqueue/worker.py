@@ -0,0 +1,93 @@
+"""
+The task worker: claims due tasks from the broker and runs them.
+
+A failing task is retried with exponential backoff (see ``TaskFunction``)
+and moved to the ``DeadTask`` table once it has used up ``max_attempts``.
+With ``concurrency`` above 1, tasks run on a thread pool; each thread has
+its own database connection. ``queues`` limits a worker to those queues.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .brokers import get_broker
+from .registry import UnknownTask, get_task
+
+logger = logging.getLogger(__name__)
+
+TASK_WORKER_CONCURRENCY = getattr(settings, 'TASK_WORKER_CONCURRENCY', 4)
+TASK_POLL_INTERVAL = getattr(settings, 'TASK_POLL_INTERVAL', 1.0)
+
+
+class Worker:
+    def __init__(self, broker=None, concurrency=TASK_WORKER_CONCURRENCY, poll_interval=TASK_POLL_INTERVAL,
+                 worker_id=None, queues=None):
+        self.broker = broker or get_broker()
+        self.queues = queues
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+
+    def run(self, burst=False):
+        """Process tasks until ``stop()`` is called, or until the queue is empty with ``burst``."""
+        processed = 0
+        pool = ThreadPoolExecutor(self.concurrency) if self.concurrency > 1 else None
+        try:
+            while not self.stopping:
+                jobs = self.broker.reserve(self.worker_id, self.concurrency, self.queues)
+                if not jobs:
+                    if burst:
+                        break
+                    close_old_connections()
+                    time.sleep(self.poll_interval)
+                    continue
+                if pool is None:
+                    for job in jobs:
+                        self.execute(job)
+                else:
+                    list(pool.map(self._execute_in_thread, jobs))
+                processed += len(jobs)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return processed
+
+    def stop(self, *args):
+        """Finish the tasks in hand, then return from ``run()``. Usable as a signal handler."""
+        self.stopping = True
+
+    def execute(self, job):
+        try:
+            get_task(job.name)(*job.args, **job.kwargs)
+        except UnknownTask:
+            logger.error("Burying task %s: no such task registered", job.name)
+            self.broker.bury(job, traceback.format_exc())
+        except Exception:
+            error = traceback.format_exc()
+            task = get_task(job.name)
+            if job.attempts >= job.max_attempts:
+                logger.error("Task %s #%s failed %s times, burying it", job.name, job.pk, job.attempts)
+                self.broker.bury(job, error)
+            else:
+                logger.warning("Task %s #%s failed, retrying", job.name, job.pk, exc_info=True)
+                self.broker.retry(job, error, task.retry_after(job.attempts))
+        else:
+            self.broker.complete(job)
+
+    def _execute_in_thread(self, job):
+        try:
+            self.execute(job)
+        finally:
+            connections.close_all()
+
+
+def run_pending(broker=None, queues=None):
+    """Run every due task in this thread and return how many ran (e.g. in tests)."""
+    return Worker(broker, concurrency=1, queues=queues).run(burst=True)
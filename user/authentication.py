@@ -0,0 +1,84 @@
+"""
+JWT authentication that keeps recently seen users in memory.
+
+``JWTAuthentication`` loads the user row on every request. Here users are
+kept in a per-process LRU cache for ``JWT_USER_CACHE_TTL`` seconds, so a
+client making a burst of API calls costs one users query. Saving or
+deleting a user evicts it from this process's cache; other processes pick
+the change up when their entry expires, so deactivating a user can take up
+to the TTL to apply everywhere.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+JWT_USER_CACHE_SIZE = getattr(settings, 'JWT_USER_CACHE_SIZE', 1024)
+JWT_USER_CACHE_TTL = getattr(settings, 'JWT_USER_CACHE_TTL', 60)
+
+
+class UserCache:
+    """A thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=JWT_USER_CACHE_SIZE, ttl=JWT_USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(str(user_id)) if user_id is not None else None
+        if user is None:
+            # Raises for unknown and inactive users, which aren't cached
+            user = super().get_user(validated_token)
+            user_cache.set(str(user_id), user)
+        elif api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        # Requests get their own copy, so changes to request.user don't leak
+        return copy.copy(user)
+
+
+def evict_user(user_id):
+    user_cache.delete(str(user_id))
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    Argon2id with costs taken from settings. Django's defaults (100 MiB,
+    parallelism 8) are sized for dedicated auth servers; ours default to the
+    OWASP minimum. Stored hashes with other costs are rehashed on login.
+    """
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', 2)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', 19 * 1024)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', 1)
@@ -1,3 +1,54 @@
+from django.contrib.auth.hashers import make_password
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from core.testing import QueryBudgetMixin
+
+from .authentication import user_cache
+from .models import User
+
+PASSWORD = 'secret-pass-123'
+
+
+class PasswordHashingTests(TestCase):
+    def test_new_passwords_use_argon2(self):
+        user = User.objects.create_user(email='new@example.com', password=PASSWORD)
+        self.assertTrue(user.password.startswith('argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+
+    def test_old_hashes_are_upgraded_on_login(self):
+        user = User.objects.create_user(email='old@example.com', password=PASSWORD)
+        User.objects.filter(pk=user.pk).update(password=make_password(PASSWORD, hasher='pbkdf2_sha256'))
+
+        response = self.client.post(reverse('login'), {'email': user.email, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$'))
+        self.assertTrue(user.check_password(PASSWORD))
+
+
+class CachedJWTAuthenticationTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='shopper@example.com', password=PASSWORD)
+
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def get(self):
+        return self.client.get(reverse('product-list-create'), **self.headers)
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(2):  # user, products
+            self.assertEqual(self.get().status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_saving_the_user_evicts_it(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get().status_code, 401)